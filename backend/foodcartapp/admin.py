@@ -14,6 +14,7 @@ from .models import (
     Order,
     OrderItem,
 )
+from .order_summary import deferred_summary_updates
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -123,6 +124,18 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ["price", "image_preview"]
     fields = ["product", "image_preview", "quantity", "price"]
 
+    def get_queryset(self, request):
+        # image_preview читает товар каждой позиции
+        return super().get_queryset(request).select_related("product")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == "product":
+            # Без этого выпадающий список товаров запрашивается заново
+            # для каждой строки формсета
+            formfield.choices = list(formfield.choices)
+        return formfield
+
     def image_preview(self, obj):
         if obj.product.image:
             return format_html(
@@ -145,15 +158,18 @@ class OrderAdmin(admin.ModelAdmin):
         "phonenumber",
         "address",
         "status",
+        "total_price",
+        "item_count",
         "created_at",
         "comments",
         "called_at",
         "delivered_at",
         "restaurant",
     ]
+    list_select_related = ["restaurant"]
     list_filter = ["status", "created_at"]
     search_fields = ["firstname", "lastname", "phonenumber", "address"]
-    readonly_fields = ["created_at"]
+    readonly_fields = ["created_at", "total_price", "item_count"]
     ordering = ["-created_at"]
 
     fieldsets = (
@@ -167,7 +183,7 @@ class OrderAdmin(admin.ModelAdmin):
                 )
             },
         ),
-        ("Способ оплаты", {"fields": ("payment",)}),
+        ("Способ оплаты", {"fields": ("payment", ("total_price", "item_count"))}),
         ("Ресторан", {"fields": ("restaurant",)}),
         (
             "Статус заказа",
@@ -253,9 +269,7 @@ class OrderAdmin(admin.ModelAdmin):
             obj_id = request.resolver_match.kwargs.get("object_id")
             if obj_id:
                 try:
-                    order = Order.objects.prefetch_related("items__product").get(
-                        id=obj_id
-                    )
+                    order = Order.objects.only("product_ids").get(id=obj_id)
                     kwargs["queryset"] = order.get_available_restaurants()
                 except Order.DoesNotExist:
                     pass
@@ -264,13 +278,15 @@ class OrderAdmin(admin.ModelAdmin):
     def save_formset(self, request, form, formset, change):
         """
         Автоматически заполняет цену в OrderItem при создании заказа.
+        Сводка заказа пересчитывается один раз после сохранения всех позиций.
         """
-        instances = formset.save(commit=False)
-        for obj in formset.deleted_objects:
-            obj.delete()
-        for instance in instances:
-            if isinstance(instance, OrderItem) and instance.price is None:
-                # Устанавливаем цену из продукта
-                instance.price = instance.product.price
-            instance.save()
-        formset.save_m2m()
+        with deferred_summary_updates():
+            instances = formset.save(commit=False)
+            for obj in formset.deleted_objects:
+                obj.delete()
+            for instance in instances:
+                if isinstance(instance, OrderItem) and instance.price is None:
+                    # Устанавливаем цену из продукта
+                    instance.price = instance.product.price
+                instance.save()
+            formset.save_m2m()
@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product
+
+CATALOG_VERSION_KEY = "foodcartapp:catalog:version"
+CATALOG_SNAPSHOT_KEY = "foodcartapp:catalog:snapshot:{version}"
+CATALOG_SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+
+def serialize_product(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": product.price,
+        "special_status": product.special_status,
+        "description": product.description,
+        "category": (
+            {
+                "id": product.category.id,
+                "name": product.category.name,
+            }
+            if product.category
+            else None
+        ),
+        "image": product.image.url,
+        "restaurant": {
+            "id": product.id,
+            "name": product.name,
+        },
+    }
+
+
+def build_catalog_snapshot():
+    """
+    Собирает каталог доступных товаров в готовом к отдаче виде:
+    компактный JSON, его gzip-версию и ETag по содержимому.
+    """
+    products = Product.objects.select_related("category").available()
+    content = json.dumps(
+        [serialize_product(product) for product in products],
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    return {
+        "etag": '"{}"'.format(hashlib.md5(content).hexdigest()),
+        "content": content,
+        "gzip_content": gzip.compress(content),
+    }
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog_snapshot():
+    """Возвращает снимок каталога из кэша, собирая его при промахе."""
+    snapshot_key = CATALOG_SNAPSHOT_KEY.format(version=get_catalog_version())
+    snapshot = cache.get(snapshot_key)
+    if snapshot is None:
+        snapshot = build_catalog_snapshot()
+        cache.set(snapshot_key, snapshot, timeout=CATALOG_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def invalidate_catalog():
+    """
+    Переключает версию каталога. Старые снимки перестают читаться
+    и вытесняются из кэша по таймауту.
+    """
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
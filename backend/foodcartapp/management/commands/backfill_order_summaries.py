@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает сохранённые в заказах сумму, количество товаров и ID "
+        "товаров по позициям. Заказы обрабатываются пачками, каждая в своей "
+        "транзакции, поэтому команду можно запускать на работающей базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Заказов в одной транзакции"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        order_ids = list(Order.objects.order_by("id").values_list("id", flat=True))
+
+        updated = 0
+        for start in range(0, len(order_ids), batch_size):
+            batch = order_ids[start:start + batch_size]
+            updated += Order.objects.filter(id__in=batch).update_summaries()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово! Проверено заказов: {len(order_ids)}, обновлено: {updated}"
+            )
+        )
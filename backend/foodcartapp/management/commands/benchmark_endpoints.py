@@ -0,0 +1,214 @@
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+from foodcartapp.seeding import get_random_cart, seed_data
+from places.geocoder import geocode_many, set_rate_limit
+
+
+def summarize(timings, errors):
+    """Статистика замеров в миллисекундах."""
+    # inclusive не выходит за пределы замеров: p99 не больше max_ms
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "mean_ms": round(statistics.mean(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "p50_ms": round(quantiles[49], 3),
+        "p95_ms": round(quantiles[94], 3),
+        "p99_ms": round(quantiles[98], 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет БД сгенерированными данными и замеряет через тестовый "
+        "клиент горячие эндпоинты: каталог, создание заказа, доску заказов, "
+        "страницу товаров, а также подбор ресторанов для заказа. Геокодер "
+        "отвечает офлайн из сгенерированного справочника, кэш - отдельный "
+        "locmem, данные откатываются. Результат - JSON с p50/p95/p99"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--restaurants", type=int, default=50, help="Количество ресторанов"
+        )
+        parser.add_argument(
+            "--products", type=int, default=100, help="Количество товаров"
+        )
+        parser.add_argument("--orders", type=int, default=2000, help="Заказов в БД")
+        parser.add_argument(
+            "--open-share",
+            type=float,
+            default=0.1,
+            help="Доля невыполненных заказов",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=50, help="Замеров на каждый эндпоинт"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=3, help="Прогревочных запросов без замера"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output", help="Файл для JSON с результатами (по умолчанию stdout)"
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("Для перцентилей нужно хотя бы 2 замера")
+
+        if settings.DEBUG:
+            self.stderr.write(
+                self.style.WARNING(
+                    "DEBUG включён: запросы пишутся в connection.queries, "
+                    "результаты будут хуже, чем в продакшене"
+                )
+            )
+
+        self.options = options
+        self.rng = random.Random(options["seed"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            replay_path = os.path.join(tmp_dir, "geocoder.json")
+            benchmark_settings = override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "LOCATION": "benchmark_endpoints",
+                    }
+                },
+                GEOCODER_BACKEND="places.backends.ReplayGeocoderBackend",
+                GEOCODER_BACKEND_OPTIONS={"path": replay_path},
+                GEOCODER_BACKGROUND_WORKERS=0,
+                GEOCODER_SNAPSHOT_PATH="",
+            )
+            # Офлайн-геокодеру ограничение частоты запросов к API не нужно
+            set_rate_limit(0)
+            try:
+                with benchmark_settings, transaction.atomic():
+                    results = self.run_benchmarks(replay_path)
+                    transaction.set_rollback(True)
+            finally:
+                set_rate_limit(settings.GEOCODER_RATE_LIMIT)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "options": {
+                name: options[name]
+                for name in [
+                    "restaurants",
+                    "products",
+                    "orders",
+                    "open_share",
+                    "requests",
+                    "warmup",
+                    "seed",
+                ]
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "debug": settings.DEBUG,
+            },
+            "results": results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+
+        if not options["output"]:
+            self.stdout.write(content)
+            return
+
+        with open(options["output"], "w", encoding="utf-8") as output_file:
+            output_file.write(content)
+        self.stdout.write(f"{'замер':<42} {'p50':>8} {'p95':>8} {'p99':>8}  мс")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<42} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                f"{stats['p99_ms']:>8.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Результаты: {options['output']}"))
+
+    def run_benchmarks(self, replay_path):
+        options = self.options
+        started_at = time.perf_counter()
+        data = seed_data(
+            restaurants=options["restaurants"],
+            products=options["products"],
+            orders=options["orders"],
+            open_share=options["open_share"],
+            seed=options["seed"],
+        )
+        with open(replay_path, "w", encoding="utf-8") as replay_file:
+            json.dump(data.addresses, replay_file, ensure_ascii=False)
+        geocode_many(data.addresses)
+        self.stderr.write(
+            f"Данные подготовлены за {time.perf_counter() - started_at:.1f} с"
+        )
+
+        client = Client()
+        manager = Client()
+        manager.force_login(User.objects.create_user("benchmark", is_staff=True))
+        open_orders = [order for order in data.orders if order.status != "completed"]
+
+        def register_order():
+            payload = {
+                "payment": "cash",
+                "firstname": "Иван",
+                "lastname": "Петров",
+                "phonenumber": "+79291000000",
+                "address": self.rng.choice(list(data.addresses)),
+                "products": [
+                    {"product": product.id, "quantity": quantity}
+                    for product, quantity in get_random_cart(self.rng, data.products)
+                ],
+            }
+            return client.post(
+                "/api/order/", data=payload, content_type="application/json"
+            )
+
+        def view_orders():
+            response = manager.get("/manager/orders/")
+            b"".join(response.streaming_content)
+            return response
+
+        return {
+            "product_list_api": self.measure(lambda: client.get("/api/products/")),
+            "register_order": self.measure(register_order),
+            "view_orders": self.measure(view_orders),
+            "view_products": self.measure(lambda: manager.get("/manager/products/")),
+            "get_available_restaurants_with_distances": self.measure(
+                lambda: self.rng.choice(
+                    open_orders or data.orders
+                ).get_available_restaurants_with_distances()
+            ),
+        }
+
+    def measure(self, func):
+        for _ in range(self.options["warmup"]):
+            func()
+
+        timings = []
+        errors = 0
+        for _ in range(self.options["requests"]):
+            started_at = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started_at) * 1000)
+            status_code = getattr(result, "status_code", 200)
+            errors += status_code >= 400
+        return summarize(timings, errors)
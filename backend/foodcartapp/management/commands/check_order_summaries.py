@@ -0,0 +1,50 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from foodcartapp.models import Order
+from foodcartapp.order_summary import find_inconsistent_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет сохранённые в заказах сумму, количество товаров и ID товаров "
+        "с позициями заказов. Завершается с ошибкой, если нашлись расхождения; "
+        "исправляет их команда backfill_order_summaries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Заказов в одной проверке"
+        )
+        parser.add_argument(
+            "--show",
+            type=int,
+            default=20,
+            help="Сколько расхождений вывести подробно",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        order_ids = list(Order.objects.order_by("id").values_list("id", flat=True))
+
+        inconsistent = {}
+        for start in range(0, len(order_ids), batch_size):
+            inconsistent.update(
+                find_inconsistent_summaries(order_ids[start:start + batch_size])
+            )
+
+        for order_id, (stored, expected) in islice(
+            inconsistent.items(), options["show"]
+        ):
+            self.stdout.write(
+                f"Заказ №{order_id}: сохранено {stored}, по позициям {expected}"
+            )
+
+        if inconsistent:
+            raise CommandError(
+                f"Расхождений: {len(inconsistent)} из {len(order_ids)} заказов. "
+                "Запустите backfill_order_summaries"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Сводки всех {len(order_ids)} заказов совпадают")
+        )
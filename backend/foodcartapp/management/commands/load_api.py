@@ -0,0 +1,411 @@
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.utils import timezone
+from foodcartapp.models import Order, Product
+from foodcartapp.order_summary import deferred_summary_updates
+from foodcartapp.seeding import get_random_cart
+
+# Заказы нагрузочного теста отличаются фамилией и удаляются после прогона
+LOAD_LASTNAME = "Нагрузочный"
+
+# Верхние границы корзин гистограммы задержек, мс
+HISTOGRAM_BOUNDS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# Адрес клиента не из INTERNAL_IPS, чтобы панель отладки не включалась
+CLIENT_ADDR = "192.0.2.1"
+
+
+def make_environ(method, path, host, body=b"", headers=None):
+    """WSGI environ запроса, пришедшего через HTTPS-прокси."""
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": host,
+        "SERVER_PORT": "443",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": CLIENT_ADDR,
+        "HTTP_HOST": host,
+        "HTTP_X_FORWARDED_PROTO": "https",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "https",
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": BytesIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in (headers or {}).items():
+        environ[name] = value
+    return environ
+
+
+def call_application(application, environ):
+    """Выполняет запрос и вычитывает тело ответа. Возвращает код ответа."""
+    statuses = []
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses.append(int(status.split(" ", 1)[0]))
+
+    result = application(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return statuses[0]
+
+
+def run_worker(worker_number, options, product_ids, addresses, started_at):
+    """
+    Процесс нагрузки: options["concurrency"] потоков в замкнутом цикле шлют
+    запросы в WSGI-приложение, каждый следующий - сразу после ответа на
+    предыдущий. Учитываются запросы, завершившиеся в окне замера.
+    """
+    application = get_wsgi_application()
+    measure_from = started_at + options["warmup"]
+    measure_until = measure_from + options["duration"]
+    latencies = {"product_list_api": [], "register_order": []}
+    statuses = {name: Counter() for name in latencies}
+    lock = threading.Lock()
+
+    def products_request(rng):
+        return make_environ(
+            "GET",
+            "/api/products/",
+            options["host"],
+            headers={"HTTP_ACCEPT_ENCODING": "gzip, deflate, br"},
+        )
+
+    def order_request(rng):
+        body = json.dumps(
+            {
+                "payment": rng.choice(["cash", "card"]),
+                "firstname": "Иван",
+                "lastname": LOAD_LASTNAME,
+                "phonenumber": "+79291000000",
+                "address": rng.choice(addresses),
+                "products": [
+                    {"product": product_id, "quantity": quantity}
+                    for product_id, quantity in get_random_cart(rng, product_ids)
+                ],
+            }
+        ).encode()
+        return make_environ(
+            "POST",
+            "/api/order/",
+            options["host"],
+            body=body,
+            headers={"CONTENT_TYPE": "application/json"},
+        )
+
+    def run_user(user_number):
+        rng = random.Random(f"{options['seed']}-{worker_number}-{user_number}")
+        time.sleep(max(started_at - time.time(), 0))
+        try:
+            while time.time() < measure_until:
+                if rng.random() < options["order_share"]:
+                    name, environ = "register_order", order_request(rng)
+                else:
+                    name, environ = "product_list_api", products_request(rng)
+
+                request_started_at = time.perf_counter()
+                try:
+                    status = call_application(application, environ)
+                except Exception as error:
+                    status = type(error).__name__
+                elapsed = (time.perf_counter() - request_started_at) * 1000
+
+                if measure_from <= time.time() <= measure_until:
+                    with lock:
+                        latencies[name].append(elapsed)
+                        statuses[name][status] += 1
+                if options["think_time"]:
+                    time.sleep(options["think_time"] / 1000)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=run_user, args=(user_number,))
+        for user_number in range(options["concurrency"])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+
+def summarize(latencies, statuses, duration):
+    """Пропускная способность, ошибки, перцентили и гистограмма задержек."""
+    requests = len(latencies)
+    errors = sum(
+        count
+        for status, count in statuses.items()
+        if not isinstance(status, int) or status >= 400
+    )
+    summary = {
+        "requests": requests,
+        "throughput_rps": round(requests / duration, 1),
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0,
+        "statuses": {str(status): count for status, count in statuses.items()},
+    }
+    if requests < 2:
+        return summary
+
+    # inclusive не выходит за пределы замеров: p99 не больше max_ms
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    summary.update(
+        {
+            "mean_ms": round(statistics.mean(latencies), 3),
+            "p50_ms": round(quantiles[49], 3),
+            "p95_ms": round(quantiles[94], 3),
+            "p99_ms": round(quantiles[98], 3),
+            "max_ms": round(max(latencies), 3),
+        }
+    )
+    histogram = Counter()
+    for latency in latencies:
+        bucket = next(
+            (f"<={bound}" for bound in HISTOGRAM_BOUNDS if latency <= bound),
+            f">{HISTOGRAM_BOUNDS[-1]}",
+        )
+        histogram[bucket] += 1
+    summary["histogram_ms"] = {
+        bucket: histogram[bucket]
+        for bucket in [f"<={bound}" for bound in HISTOGRAM_BOUNDS]
+        + [f">{HISTOGRAM_BOUNDS[-1]}"]
+        if histogram[bucket]
+    }
+    return summary
+
+
+def parse_levels(value):
+    try:
+        levels = [int(level) for level in value.split(",")]
+    except ValueError:
+        levels = []
+    if not levels or min(levels) < 1:
+        raise CommandError("--concurrency: положительные числа через запятую")
+    return levels
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест POST /api/order/ и GET /api/products/ без сети: "
+        "процессы с потоками в замкнутом цикле вызывают WSGI-приложение "
+        "напрямую. Уровни параллельности прогоняются по очереди, чтобы найти "
+        "точку насыщения. Заказы теста удаляются после прогона"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Процессов нагрузки (по умолчанию - число ядер)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=parse_levels,
+            default=[1, 2, 4, 8],
+            help="Потоков на процесс, несколько уровней через запятую: 1,2,4,8",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=20, help="Секунд замера на уровень"
+        )
+        parser.add_argument(
+            "--warmup", type=float, default=3, help="Секунд прогрева на уровень"
+        )
+        parser.add_argument(
+            "--order-share",
+            type=float,
+            default=0.2,
+            help="Доля запросов на создание заказа, остальные - каталог",
+        )
+        parser.add_argument(
+            "--think-time", type=float, default=0, help="Пауза между запросами, мс"
+        )
+        parser.add_argument(
+            "--host", help="Заголовок Host (по умолчанию из ALLOWED_HOSTS)"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--keep-orders",
+            action="store_true",
+            help="Не удалять созданные тестом заказы",
+        )
+        parser.add_argument(
+            "--output", help="Файл для JSON с результатами (по умолчанию stdout)"
+        )
+
+    def handle(self, *args, **options):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("Нужна ОС с fork: процессы наследуют настроенный Django")
+        if options["processes"] < 1:
+            raise CommandError("--processes должно быть не меньше 1")
+        if settings.DEBUG:
+            self.stderr.write(
+                self.style.WARNING(
+                    "DEBUG включён: запросы пишутся в connection.queries, "
+                    "результаты будут хуже, чем в продакшене"
+                )
+            )
+
+        product_ids = list(Product.objects.available().values_list("id", flat=True))
+        if not product_ids:
+            raise CommandError("Нет товаров в продаже, заказы создавать не из чего")
+        addresses = list(
+            Order.objects.exclude(lastname=LOAD_LASTNAME)
+            .order_by("-id")
+            .values_list("address", flat=True)[:1000]
+        ) or ["Москва, Красная площадь, 1"]
+        options["host"] = options["host"] or self.get_default_host()
+        last_order_id = Order.objects.order_by("-id").values_list("id", flat=True)
+        last_order_id = last_order_id.first() or 0
+
+        try:
+            steps = [
+                self.run_step(concurrency, options, product_ids, addresses)
+                for concurrency in options["concurrency"]
+            ]
+        finally:
+            if not options["keep_orders"]:
+                self.delete_orders(last_order_id)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "options": {
+                name: options[name]
+                for name in [
+                    "processes",
+                    "concurrency",
+                    "duration",
+                    "warmup",
+                    "order_share",
+                    "think_time",
+                    "seed",
+                ]
+            },
+            "environment": {
+                "cpu_count": os.cpu_count(),
+                "database": connection.vendor,
+                "debug": settings.DEBUG,
+                "products": len(product_ids),
+            },
+            "steps": steps,
+        }
+        if not options["output"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        with open(options["output"], "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+        self.print_report(steps)
+        self.stdout.write(self.style.SUCCESS(f"Результаты: {options['output']}"))
+
+    @staticmethod
+    def get_default_host():
+        for host in settings.ALLOWED_HOSTS:
+            if host != "*":
+                return host.lstrip(".")
+        return "localhost"
+
+    def run_step(self, concurrency, options, product_ids, addresses):
+        processes = options["processes"]
+        self.stderr.write(
+            f"Параллельность {processes} x {concurrency}: "
+            f"{options['warmup'] + options['duration']:.0f} с"
+        )
+        worker_options = {**options, "concurrency": concurrency}
+        # Дочерние процессы не должны унаследовать открытые соединения с БД
+        connections.close_all()
+        started_at = time.time() + 1
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    run_worker,
+                    worker_number,
+                    worker_options,
+                    product_ids,
+                    addresses,
+                    started_at,
+                )
+                for worker_number in range(processes)
+            ]
+            results = [future.result() for future in futures]
+
+        endpoints = {}
+        for name in ["product_list_api", "register_order"]:
+            latencies = []
+            statuses = Counter()
+            for worker_latencies, worker_statuses in results:
+                latencies.extend(worker_latencies[name])
+                statuses.update(worker_statuses[name])
+            endpoints[name] = summarize(latencies, statuses, options["duration"])
+
+        return {
+            "concurrency": concurrency,
+            "virtual_users": processes * concurrency,
+            "throughput_rps": round(
+                sum(endpoint["throughput_rps"] for endpoint in endpoints.values()), 1
+            ),
+            "endpoints": endpoints,
+        }
+
+    def delete_orders(self, last_order_id):
+        # Позиции удаляются каскадно, пересчёт сводок откладывается, чтобы
+        # не запускать его на каждую позицию
+        with deferred_summary_updates():
+            deleted, _ = Order.objects.filter(
+                id__gt=last_order_id, lastname=LOAD_LASTNAME
+            ).delete()
+        self.stderr.write(f"Удалено записей теста: {deleted}")
+
+    def print_report(self, steps):
+        self.stdout.write(
+            f"{'пользователей':>13} {'эндпоинт':<18} {'rps':>8} {'p50':>8} "
+            f"{'p95':>8} {'p99':>8} {'ошибки':>7}"
+        )
+        for step in steps:
+            for name, stats in step["endpoints"].items():
+                if stats["requests"] < 2:
+                    continue
+                self.stdout.write(
+                    f"{step['virtual_users']:>13} {name:<18} "
+                    f"{stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+                    f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                    f"{stats['error_rate']:>7.1%}"
+                )
+
+        last_step = steps[-1]
+        for name, stats in last_step["endpoints"].items():
+            histogram = stats.get("histogram_ms")
+            if not histogram:
+                continue
+            self.stdout.write(
+                f"\n{name}, {last_step['virtual_users']} пользователей, мс:"
+            )
+            largest = max(histogram.values())
+            for bucket, count in histogram.items():
+                bar = "#" * max(round(count / largest * 40), 1)
+                self.stdout.write(f"{bucket:>7} {count:>8} {bar}")
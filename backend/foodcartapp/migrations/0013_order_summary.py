@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:42
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0012_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='product_ids',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='ID товаров'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='Сумма заказа'),
+        ),
+    ]
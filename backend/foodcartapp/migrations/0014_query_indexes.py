@@ -0,0 +1,60 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0013_order_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='called_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Позвонили'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Доставили'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='firstname',
+            field=models.CharField(max_length=50, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='lastname',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='payment',
+            field=models.CharField(choices=[('cash', 'Наличные'), ('card', 'Карта')], max_length=20, verbose_name='Способ оплаты'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Необработанный'), ('assembly', 'Готовится'), ('delivery', 'Доставка'), ('completed', 'Выполнено')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantmenuitem',
+            name='availability',
+            field=models.BooleanField(default=True, verbose_name='в продаже'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'completed'), _negated=True), fields=['-created_at', '-id'], name='order_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(condition=models.Q(('availability', True)), fields=['product', 'restaurant'], name='menuitem_available_idx'),
+        ),
+    ]
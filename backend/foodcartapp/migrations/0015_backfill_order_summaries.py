@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def calculate_order_summary(items):
+    # Копия foodcartapp.models.calculate_order_summary на момент миграции
+    total_price = Decimal("0.00")
+    item_count = 0
+    product_ids = set()
+    for product_id, price, quantity in items:
+        total_price += price * quantity
+        item_count += quantity
+        product_ids.add(product_id)
+
+    return {
+        "total_price": total_price,
+        "item_count": item_count,
+        "product_ids": sorted(product_ids),
+    }
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model("foodcartapp", "Order")
+    OrderItem = apps.get_model("foodcartapp", "OrderItem")
+    summary_fields = ["total_price", "item_count", "product_ids"]
+
+    last_id = 0
+    while True:
+        orders = list(
+            Order.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", *summary_fields)[:BATCH_SIZE]
+        )
+        if not orders:
+            break
+        last_id = orders[-1].id
+
+        items_by_order = {order.id: [] for order in orders}
+        for order_id, *item in OrderItem.objects.filter(
+            order_id__in=items_by_order
+        ).values_list("order_id", "product_id", "price", "quantity"):
+            items_by_order[order_id].append(item)
+
+        for order in orders:
+            summary = calculate_order_summary(items_by_order[order.id])
+            for field, value in summary.items():
+                setattr(order, field, value)
+        Order.objects.bulk_update(orders, summary_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0014_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_order_summaries, migrations.RunPython.noop, elidable=True
+        ),
+    ]
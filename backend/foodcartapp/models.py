@@ -1,12 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db.models import F, Sum, Value, DecimalField, ExpressionWrapper
-from django.db.models.functions import Coalesce
 from decimal import Decimal
 from django.db.models import Q, Count
-from places.geocoder import calculate_distance, get_coordinates
+from places.distances import get_restaurant_distances
+from places.geocoder import get_coordinates
 
 
 class Restaurant(models.Model):
@@ -97,34 +96,83 @@ class RestaurantMenuItem(models.Model):
         related_name="menu_items",
         verbose_name="продукт",
     )
-    availability = models.BooleanField("в продаже", default=True, db_index=True)
+    availability = models.BooleanField("в продаже", default=True)
 
     class Meta:
         verbose_name = "пункт меню ресторана"
         verbose_name_plural = "пункты меню ресторана"
         unique_together = [["restaurant", "product"]]
+        indexes = [
+            # ProductQuerySet.available и матрица меню читают только позиции
+            # в продаже, пары (товар, ресторан) берутся прямо из индекса
+            models.Index(
+                fields=["product", "restaurant"],
+                condition=Q(availability=True),
+                name="menuitem_available_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
-class OrderQuerySet(models.QuerySet):
+def calculate_order_summary(items):
     """
-    Аннотирует каждый заказ полем total_price - общей суммой заказа.
+    Считает сводку заказа по позициям.
 
-    Returns:
-        QuerySet с дополнительным полем total_price
+    items - тройки (product_id, цена, количество), результат - словарь
+    полей Order: total_price, item_count и product_ids.
     """
+    total_price = Decimal("0.00")
+    item_count = 0
+    product_ids = set()
+    for product_id, price, quantity in items:
+        total_price += price * quantity
+        item_count += quantity
+        product_ids.add(product_id)
 
-    def with_total_price(self):
-        multiplication = ExpressionWrapper(
-            F("items__price") * F("items__quantity"),
-            output_field=DecimalField(),
-        )
+    return {
+        "total_price": total_price,
+        "item_count": item_count,
+        "product_ids": sorted(product_ids),
+    }
 
-        return self.annotate(
-            total_price=Coalesce(Sum(multiplication), Value(Decimal("0.00")))
-        )
+
+class OrderQuerySet(models.QuerySet):
+    def update_summaries(self):
+        """
+        Пересчитывает сводку (total_price, item_count, product_ids) заказов
+        по их позициям и сохраняет только изменившиеся заказы.
+        Заказы блокируются до конца транзакции, чтобы параллельная правка
+        позиций не записала устаревшую сводку. Возвращает число обновлённых
+        заказов.
+        """
+        with transaction.atomic():
+            orders = list(
+                self.select_for_update().only("id", *Order.SUMMARY_FIELDS)
+            )
+            items_by_order = {order.id: [] for order in orders}
+            for order_id, *item in OrderItem.objects.filter(
+                order_id__in=items_by_order
+            ).values_list("order_id", "product_id", "price", "quantity"):
+                items_by_order[order_id].append(item)
+
+            changed_orders = []
+            updated_at = timezone.now()
+            for order in orders:
+                summary = calculate_order_summary(items_by_order[order.id])
+                if order.get_summary() == summary:
+                    continue
+                for field, value in summary.items():
+                    setattr(order, field, value)
+                # Доска заказов узнаёт об изменениях по updated_at
+                order.updated_at = updated_at
+                changed_orders.append(order)
+
+            Order.objects.bulk_update(
+                changed_orders, [*Order.SUMMARY_FIELDS, "updated_at"], batch_size=500
+            )
+        return len(changed_orders)
 
 
 class Order(models.Model):
@@ -147,50 +195,81 @@ class Order(models.Model):
     PAYMENT_CHOICES = [("cash", "Наличные"), ("card", "Карта")]
 
     address = models.TextField("Адрес доставки", max_length=100)
-    firstname = models.CharField("Имя", max_length=50, db_index=True)
-    lastname = models.CharField("Фамилия", max_length=50, blank=True, db_index=True)
+    firstname = models.CharField("Имя", max_length=50)
+    lastname = models.CharField("Фамилия", max_length=50, blank=True)
     phonenumber = PhoneNumberField("Телефон", region="RU", db_index=True)
     created_at = models.DateTimeField("Создан", default=timezone.now, db_index=True)
-    called_at = models.DateTimeField("Позвонили", null=True, blank=True, db_index=True)
-    delivered_at = models.DateTimeField(
-        "Доставили", null=True, blank=True, db_index=True
-    )
+    updated_at = models.DateTimeField("Изменён", auto_now=True, db_index=True)
+    called_at = models.DateTimeField("Позвонили", null=True, blank=True)
+    delivered_at = models.DateTimeField("Доставили", null=True, blank=True)
     status = models.CharField(
         "Статус",
         max_length=20,
         choices=STATUS_CHOICES,
         default="pending",
-        db_index=True,
     )
 
     payment = models.CharField(
         "Способ оплаты",
         max_length=20,
         choices=PAYMENT_CHOICES,
-        db_index=True,
     )
 
     comments = models.TextField("Комментарий", blank=True)
 
+    # Сводка по позициям хранится в заказе, чтобы доске и админке не нужны
+    # были JOIN и prefetch позиций. Её пересчитывают OrderSerializer.create
+    # и сигналы OrderItem, сверяет команда check_order_summaries
+    total_price = models.DecimalField(
+        "Сумма заказа",
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+    )
+    item_count = models.PositiveIntegerField(
+        "Количество товаров", default=0, editable=False
+    )
+    product_ids = models.JSONField(
+        "ID товаров", default=list, blank=True, editable=False
+    )
+
+    SUMMARY_FIELDS = ["total_price", "item_count", "product_ids"]
+
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-created_at"]
+        indexes = [
+            # Доска заказов по умолчанию: все невыполненные заказы по
+            # (-created_at, -id). Выполненных заказов со временем
+            # подавляющее большинство, в частичный индекс они не попадают
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=~Q(status="completed"),
+                name="order_open_created_idx",
+            ),
+            # Доска с фильтром по статусу, в том числе по выполненным
+            models.Index(
+                fields=["status", "-created_at", "-id"],
+                name="order_status_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ №{self.id} от {self.firstname}"
 
+    def get_summary(self):
+        return {field: getattr(self, field) for field in self.SUMMARY_FIELDS}
+
     def get_available_restaurants(self):
         """
         Возвращает QuerySet ресторанов, которые могут приготовить этот заказ.
         Ресторан может приготовить заказ, если у него есть ВСЕ товары из заказа.
         """
-        if not self.items.exists():
-            return Restaurant.objects.none()
-
-        product_ids = list(self.items.values_list("product_id", flat=True).distinct())
+        product_ids = self.product_ids
         product_count = len(product_ids)
 
         if product_count == 0:
@@ -218,22 +297,21 @@ class Order(models.Model):
         """
         Возвращает QuerySet ресторанов с расстояниями до адреса доставки.
         """
-        available_restaurants = self.get_available_restaurants()
-
-        order_coords = get_coordinates(self.address)
+        available_restaurants = list(self.get_available_restaurants())
 
-        restaurants_with_distances = []
+        # Адреса должны быть геокодированы и сохранены в Place, повторные
+        # вызовы обслуживает кэш координат без запросов к БД
+        get_coordinates(self.address)
         for restaurant in available_restaurants:
-            restaurant_coords = get_coordinates(restaurant.address)
+            get_coordinates(restaurant.address)
 
-            distance = None
-            if order_coords and restaurant_coords:
-                try:
-                    distance = calculate_distance(order_coords, restaurant_coords)
-                except ValueError as e:
-                    print(f"Ошибка расчета расстояния: {e}")
-                    distance = None
+        distances = get_restaurant_distances(
+            (restaurant, self.address) for restaurant in available_restaurants
+        )
 
+        restaurants_with_distances = []
+        for restaurant in available_restaurants:
+            distance = distances.get((restaurant.id, self.address))
             restaurants_with_distances.append(
                 {
                     "restaurant": restaurant,
@@ -252,6 +330,19 @@ class Order(models.Model):
         return restaurants_with_distances
 
 
+class OrderItemQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Удаляет позиции и пересчитывает сводки их заказов один раз на заказ,
+        а не на каждую удалённую позицию.
+        """
+        with transaction.atomic():
+            order_ids = set(self.values_list("order_id", flat=True))
+            result = super().delete()
+            Order.objects.filter(id__in=order_ids).update_summaries()
+        return result
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(
         Order, on_delete=models.CASCADE, related_name="items", verbose_name="Заказ"
@@ -272,6 +363,8 @@ class OrderItem(models.Model):
         validators=[MinValueValidator(0)],
     )
 
+    objects = OrderItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Позиция заказа"
         verbose_name_plural = "Позиции заказа"
@@ -0,0 +1,58 @@
+import threading
+from contextlib import contextmanager
+
+from .models import Order, OrderItem, calculate_order_summary
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_summary_updates():
+    """
+    Откладывает пересчёт сводок заказов до конца блока: сколько бы позиций
+    ни сохранили внутри, сводка каждого заказа пересчитается один раз.
+    Вложенные блоки присоединяются к внешнему.
+    """
+    if getattr(_deferred, "order_ids", None) is not None:
+        yield
+        return
+
+    _deferred.order_ids = order_ids = set()
+    try:
+        yield
+    finally:
+        _deferred.order_ids = None
+    if order_ids:
+        Order.objects.filter(id__in=order_ids).update_summaries()
+
+
+def schedule_summary_update(order_id):
+    """Пересчитывает сводку заказа сейчас или в конце deferred_summary_updates."""
+    order_ids = getattr(_deferred, "order_ids", None)
+    if order_ids is not None:
+        order_ids.add(order_id)
+    else:
+        Order.objects.filter(id=order_id).update_summaries()
+
+
+def find_inconsistent_summaries(order_ids):
+    """
+    Сверяет сохранённые сводки заказов order_ids с их позициями.
+    Возвращает словарь {order_id: (сохранённая сводка, верная сводка)}
+    для заказов, где они расходятся.
+    """
+    items_by_order = {order_id: [] for order_id in order_ids}
+    for order_id, *item in OrderItem.objects.filter(
+        order_id__in=order_ids
+    ).values_list("order_id", "product_id", "price", "quantity"):
+        items_by_order[order_id].append(item)
+
+    inconsistent = {}
+    for order in Order.objects.filter(id__in=order_ids).only(
+        "id", *Order.SUMMARY_FIELDS
+    ):
+        stored = order.get_summary()
+        expected = calculate_order_summary(items_by_order[order.id])
+        if stored != expected:
+            inconsistent[order.id] = (stored, expected)
+    return inconsistent
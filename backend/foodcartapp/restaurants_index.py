@@ -0,0 +1,131 @@
+import threading
+import time
+
+from django.core.cache import cache
+from places.geocoder import get_cached_coordinates
+from places.normalization import normalize_address
+from places.spatial import GridIndex
+
+from .models import Restaurant, RestaurantMenuItem
+
+RESTAURANTS_INDEX_VERSION_KEY = "foodcartapp:restaurants_index:version"
+RESTAURANTS_INDEX_KEY = "foodcartapp:restaurants_index:{version}"
+RESTAURANTS_INDEX_TIMEOUT = 24 * 60 * 60
+
+
+class RestaurantsIndex:
+    """
+    Индекс ресторанов для поиска ближайших: сетка по координатам ресторанов
+    и битовые маски ресторанов, где есть каждый товар (бит i - ресторан
+    restaurants[i]). Ресторан может выполнить заказ, если его бит есть
+    в масках всех товаров.
+    """
+
+    def __init__(self, restaurants, coordinates, menu_items):
+        """
+        coordinates - словарь {адрес: (широта, долгота)},
+        menu_items - пары (restaurant_id, product_id) доступных позиций меню.
+        """
+        self.restaurants = list(restaurants)
+        # По этим адресам сигналы Place решают, нужно ли пересобрать индекс
+        self.address_keys = {
+            normalize_address(restaurant.address)
+            for restaurant in self.restaurants
+            if restaurant.address
+        }
+
+        positions = {
+            restaurant.id: position
+            for position, restaurant in enumerate(self.restaurants)
+        }
+        self.product_masks = {}
+        for restaurant_id, product_id in menu_items:
+            position = positions.get(restaurant_id)
+            if position is not None:
+                self.product_masks[product_id] = (
+                    self.product_masks.get(product_id, 0) | 1 << position
+                )
+
+        self.grid = GridIndex(
+            (position, coordinates.get(restaurant.address))
+            for position, restaurant in enumerate(self.restaurants)
+        )
+
+    def nearest(self, coords, product_ids, limit):
+        """
+        Возвращает до limit ближайших к coords ресторанов, в которых есть все
+        товары product_ids, как список пар (ресторан, расстояние в км).
+        """
+        mask = (1 << len(self.restaurants)) - 1
+        for product_id in set(product_ids):
+            mask &= self.product_masks.get(product_id, 0)
+        if not mask:
+            return []
+
+        found = self.grid.nearest(
+            coords, limit, accept=lambda position: mask >> position & 1
+        )
+        return [(self.restaurants[position], distance) for position, distance in found]
+
+
+def build_restaurants_index():
+    restaurants = list(Restaurant.objects.order_by("id"))
+    coordinates, _ = get_cached_coordinates(
+        restaurant.address for restaurant in restaurants
+    )
+    menu_items = RestaurantMenuItem.objects.filter(availability=True).values_list(
+        "restaurant_id", "product_id"
+    )
+    return RestaurantsIndex(restaurants, coordinates, menu_items)
+
+
+def get_restaurants_index_version():
+    version = cache.get(RESTAURANTS_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(RESTAURANTS_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(RESTAURANTS_INDEX_VERSION_KEY)
+    return version
+
+
+_local_index = (None, None)
+_local_index_lock = threading.Lock()
+
+
+def get_restaurants_index(build=True):
+    """
+    Возвращает индекс ресторанов текущей версии: из памяти процесса, из кэша
+    или собирает его заново. С build=False вместо сборки возвращает None.
+    """
+    global _local_index
+
+    version = get_restaurants_index_version()
+    local_version, index = _local_index
+    if local_version == version:
+        return index
+
+    index_key = RESTAURANTS_INDEX_KEY.format(version=version)
+    index = cache.get(index_key)
+    if index is None:
+        if not build:
+            return None
+        index = build_restaurants_index()
+        cache.set(index_key, index, timeout=RESTAURANTS_INDEX_TIMEOUT)
+
+    with _local_index_lock:
+        _local_index = (version, index)
+    return index
+
+
+def invalidate_restaurants_index():
+    """Переключает версию индекса, следующий запрос соберёт его заново."""
+    cache.set(RESTAURANTS_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_restaurants_index_for_places(keys):
+    """
+    Сбрасывает индекс, если изменились координаты адресов ресторанов.
+    Изменения адресов заказов индекс не затрагивают.
+    """
+    index = get_restaurants_index(build=False)
+    if index is not None and index.address_keys & set(keys):
+        invalidate_restaurants_index()
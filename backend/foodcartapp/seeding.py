@@ -0,0 +1,152 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.utils import timezone
+
+from .models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+    calculate_order_summary,
+)
+
+# Широта и долгота сгенерированных адресов - примерно пределы Москвы
+SEED_LATITUDES = (55.55, 55.95)
+SEED_LONGITUDES = (37.35, 37.85)
+
+# Размер корзины и его относительная частота: чаще всего заказывают
+# один-три товара, большие корзины редки
+CART_SIZE_WEIGHTS = {1: 30, 2: 25, 3: 18, 4: 10, 5: 7, 6: 4, 8: 3, 10: 2, 15: 1}
+
+OPEN_STATUSES = ["pending", "assembly", "delivery"]
+
+
+def get_random_cart(rng, products):
+    """Случайная корзина: список пар (товар, количество) разных товаров."""
+    size = rng.choices(list(CART_SIZE_WEIGHTS), weights=CART_SIZE_WEIGHTS.values())[0]
+    return [
+        (product, rng.choice([1, 1, 1, 2, 2, 3]))
+        for product in rng.sample(products, min(size, len(products)))
+    ]
+
+
+def seed_data(
+    restaurants=50,
+    products=100,
+    orders=2000,
+    open_share=0.2,
+    availability=0.9,
+    seed=42,
+    batch_size=2000,
+):
+    """
+    Быстро заполняет БД через bulk_create: рестораны, товары, меню
+    ресторанов и заказы с позициями и готовой сводкой. Сигналы моделей
+    при этом не вызываются.
+
+    Возвращает SimpleNamespace со списками restaurants, products, orders
+    и словарём addresses {адрес: (широта, долгота)} всех адресов
+    ресторанов и заказов - из него собирается офлайн-геокодер.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    addresses = {}
+
+    def make_address(kind, number):
+        address = f"Москва, ул. {kind}, {number}"
+        addresses[address] = (
+            round(rng.uniform(*SEED_LATITUDES), 6),
+            round(rng.uniform(*SEED_LONGITUDES), 6),
+        )
+        return address
+
+    categories = ProductCategory.objects.bulk_create(
+        ProductCategory(name=name) for name in ["Бургеры", "Напитки", "Закуски"]
+    )
+    product_objects = Product.objects.bulk_create(
+        (
+            Product(
+                name=f"Товар {number}",
+                category=rng.choice(categories),
+                price=Decimal(rng.randrange(50, 800)),
+                image="product.jpg",
+                special_status=rng.random() < 0.1,
+            )
+            for number in range(products)
+        ),
+        batch_size=batch_size,
+    )
+    restaurant_objects = Restaurant.objects.bulk_create(
+        (
+            Restaurant(
+                name=f"Ресторан {number}",
+                address=make_address("Ресторанная", number),
+                contact_phone="+79291000000",
+            )
+            for number in range(restaurants)
+        ),
+        batch_size=batch_size,
+    )
+    RestaurantMenuItem.objects.bulk_create(
+        (
+            RestaurantMenuItem(
+                restaurant=restaurant,
+                product=product,
+                availability=rng.random() < availability,
+            )
+            for restaurant in restaurant_objects
+            for product in product_objects
+        ),
+        batch_size=batch_size,
+    )
+
+    # Адресов меньше, чем заказов: клиенты заказывают повторно
+    order_addresses = [
+        make_address("Заказная", number) for number in range(max(orders // 2, 1))
+    ]
+    order_objects = []
+    for start in range(0, orders, batch_size):
+        batch = []
+        items = []
+        for _ in range(min(batch_size, orders - start)):
+            cart = [
+                OrderItem(product=product, price=product.price, quantity=quantity)
+                for product, quantity in get_random_cart(rng, product_objects)
+            ]
+            is_open = rng.random() < open_share
+            batch.append(
+                Order(
+                    address=rng.choice(order_addresses),
+                    firstname="Иван",
+                    lastname="Петров",
+                    phonenumber="+79291000000",
+                    payment=rng.choice(["cash", "card"]),
+                    status=rng.choice(OPEN_STATUSES) if is_open else "completed",
+                    created_at=now - timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+                    **calculate_order_summary(
+                        (item.product.id, item.price, item.quantity) for item in cart
+                    ),
+                )
+            )
+            items.append(cart)
+
+        batch = Order.objects.bulk_create(batch)
+        for order, cart in zip(batch, items):
+            for item in cart:
+                item.order = order
+        OrderItem.objects.bulk_create(
+            (item for cart in items for item in cart), batch_size=batch_size
+        )
+        order_objects.extend(batch)
+
+    return SimpleNamespace(
+        restaurants=restaurant_objects,
+        products=product_objects,
+        orders=order_objects,
+        addresses=addresses,
+    )
@@ -1,18 +1,62 @@
 from rest_framework import serializers
 from phonenumber_field.serializerfields import PhoneNumberField
-from .models import Order, OrderItem, Product
+from .models import Order, OrderItem, Product, calculate_order_summary
 from django.db import transaction
 
 
+class ProductPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """
+    Ищет товар в словаре, заранее загруженном OrderItemListSerializer,
+    вместо отдельного запроса к БД на каждую позицию заказа.
+    """
+
+    def to_internal_value(self, data):
+        products_by_id = getattr(self.parent, "products_by_id", None)
+        if products_by_id is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            product_id = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+        product = products_by_id.get(product_id)
+        if product is None:
+            self.fail("does_not_exist", pk_value=data)
+        return product
+
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    """Загружает все товары заказа одним запросом через in_bulk."""
+
+    def to_internal_value(self, data):
+        product_ids = set()
+        if isinstance(data, list):
+            for item in data:
+                if not isinstance(item, dict) or isinstance(item.get("product"), bool):
+                    continue
+                try:
+                    product_ids.add(int(item.get("product")))
+                except (TypeError, ValueError):
+                    continue
+
+        self.child.products_by_id = Product.objects.in_bulk(product_ids)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.products_by_id = None
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(), required=True
-    )
+    product = ProductPrimaryKeyField(queryset=Product.objects.all(), required=True)
     quantity = serializers.IntegerField(min_value=1, required=True)
 
     class Meta:
         model = OrderItem
         fields = ["product", "quantity"]
+        list_serializer_class = OrderItemListSerializer
 
     def validate(self, data):
         product = data.get("product")
@@ -63,24 +107,35 @@ class OrderSerializer(serializers.ModelSerializer):
         if phone_number:
             validated_data["phonenumber"] = str(phone_number)
 
-        with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-
-            for item_data in items_data:
-                product = item_data.get("product")
-                quantity = item_data.get("quantity")
+        order_items = []
+        for item_data in items_data:
+            product = item_data.get("product")
+            quantity = item_data.get("quantity")
 
-                if not product:
-                    raise serializers.ValidationError(
-                        {"products": "Товар обязателен для каждой позиции"}
-                    )
+            if not product:
+                raise serializers.ValidationError(
+                    {"products": "Товар обязателен для каждой позиции"}
+                )
 
-                OrderItem.objects.create(
-                    order=order,
+            order_items.append(
+                OrderItem(
                     product=product,
                     quantity=quantity,
                     price=product.price,
                 )
+            )
+
+        # bulk_create не вызывает сигналы OrderItem, поэтому сводка
+        # считается здесь и сохраняется тем же INSERT, что и заказ
+        summary = calculate_order_summary(
+            (item.product_id, item.price, item.quantity) for item in order_items
+        )
+
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data, **summary)
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
 
         return order
 
@@ -109,3 +164,27 @@ class OrderSerializer(serializers.ModelSerializer):
                 f"Недопустимый способ оплаты. Допустимые значения: {', '.join(valid_choices)}"
             )
         return value
+
+
+class ProductIdListField(serializers.Field):
+    """Список ID товаров из строки вида "1,2,3"."""
+
+    default_error_messages = {
+        "invalid": "Ожидается список ID товаров через запятую.",
+    }
+
+    def to_internal_value(self, data):
+        product_ids = [product_id.strip() for product_id in str(data).split(",")]
+        try:
+            return [int(product_id) for product_id in product_ids if product_id]
+        except ValueError:
+            self.fail("invalid")
+
+    def to_representation(self, value):
+        return ",".join(str(product_id) for product_id in value)
+
+
+class NearestRestaurantsQuerySerializer(serializers.Serializer):
+    address = serializers.CharField(max_length=200)
+    products = ProductIdListField(required=False, default=list)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=5)
@@ -0,0 +1,82 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from places.geocoder import coordinates_changed
+from places.models import Place, RestaurantDistance
+
+from .catalog import invalidate_catalog
+from .models import (
+    Order,
+    OrderItem,
+    OrderItemQuerySet,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .order_summary import schedule_summary_update
+from .restaurants_index import (
+    invalidate_restaurants_index,
+    invalidate_restaurants_index_for_places,
+)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_catalog_on_change(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_distances_on_restaurant_change(sender, instance, created, **kwargs):
+    # Расстояния зависят от адреса ресторана, а правки ресторанов редки,
+    # поэтому сохранённые расстояния сбрасываются при любом изменении
+    if not created:
+        RestaurantDistance.objects.filter(restaurant=instance).delete()
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_restaurants_index_on_change(sender, **kwargs):
+    transaction.on_commit(invalidate_restaurants_index)
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidate_restaurants_index_on_place_change(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(invalidate_restaurants_index_for_places, [instance.normalized_address])
+    )
+
+
+@receiver(coordinates_changed)
+def invalidate_restaurants_index_on_bulk_change(sender, keys, **kwargs):
+    transaction.on_commit(partial(invalidate_restaurants_index_for_places, keys))
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_summary_on_item_change(sender, instance, raw=False, **kwargs):
+    # При загрузке фикстур сводки восстанавливает backfill_order_summaries
+    if not raw:
+        schedule_summary_update(instance.order_id)
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_order_summary_on_item_delete(sender, instance, origin=None, **kwargs):
+    # Позиции удаляемого заказа пересчитывать незачем, а удаление позиций
+    # через QuerySet пересчитывает сводки само, один раз на заказ
+    if isinstance(origin, (Order, OrderItemQuerySet)):
+        return
+    if isinstance(origin, QuerySet) and origin.model is Order:
+        return
+    schedule_summary_update(instance.order_id)
@@ -0,0 +1,78 @@
+"""Общие данные для тестов числа запросов в foodcartapp и restaurateur."""
+from places.models import Place
+
+from .models import Order, OrderItem, Product, Restaurant, RestaurantMenuItem
+
+# Размеры данных: (ресторанов, товаров, заказов). Число запросов не должно
+# зависеть от размера, иначе в view появился N+1
+DATA_SIZES = [(2, 3, 3), (10, 20, 40)]
+
+
+class DataSeeder:
+    """
+    Досоздаёт рестораны, товары с полным меню и заказы до нужного размера,
+    поэтому один тест может пройти по всем DATA_SIZES по возрастанию.
+
+    С geocoded=True адреса ресторанов и заказов сразу получают координаты
+    в Place. products_per_order ограничивает число позиций заказа,
+    по умолчанию в каждый заказ входят все товары.
+    """
+
+    def __init__(self, category=None, geocoded=False, products_per_order=None):
+        self.category = category
+        self.geocoded = geocoded
+        self.products_per_order = products_per_order
+        self.restaurants = []
+        self.products = []
+        self.orders = []
+
+    def seed(self, restaurants_count, products_count, orders_count):
+        for number in range(len(self.restaurants), restaurants_count):
+            address = f"Москва, Ресторанная, {number}"
+            if self.geocoded:
+                Place.objects.create(address=address, lat=55.7 + number / 100, lon=37.6)
+            self.restaurants.append(
+                Restaurant.objects.create(name=f"Ресторан {number}", address=address)
+            )
+        for number in range(len(self.products), products_count):
+            self.products.append(
+                Product.objects.create(
+                    name=f"Товар {number}",
+                    price=100 + number,
+                    image="product.jpg",
+                    category=self.category,
+                )
+            )
+        RestaurantMenuItem.objects.bulk_create(
+            (
+                RestaurantMenuItem(restaurant=restaurant, product=product)
+                for restaurant in self.restaurants
+                for product in self.products
+            ),
+            ignore_conflicts=True,
+        )
+
+        for number in range(len(self.orders), orders_count):
+            address = f"Москва, Заказная, {number}"
+            if self.geocoded:
+                Place.objects.create(
+                    address=address, lat=55.75, lon=37.5 + number / 100
+                )
+            order = Order.objects.create(
+                address=address,
+                firstname="Иван",
+                phonenumber="+79291000000",
+                payment="cash",
+                # Часть заказов уже передана ресторану
+                restaurant=self.restaurants[0] if number % 3 == 0 else None,
+            )
+            products = self.products
+            if self.products_per_order is not None:
+                offset = number % 3
+                products = products[offset:offset + self.products_per_order]
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, price=product.price)
+                for product in products
+            )
+            self.orders.append(order)
+        Order.objects.all().update_summaries()
@@ -0,0 +1,434 @@
+import gzip
+import json
+from importlib import import_module
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from places.models import Place
+
+from .management.commands import load_api
+from .management.commands.benchmark_endpoints import summarize
+from .models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .order_summary import deferred_summary_updates, find_inconsistent_summaries
+from .restaurants_index import RestaurantsIndex
+from .testing import DATA_SIZES, DataSeeder
+from .views import NearestRestaurantsThrottle
+
+
+class RegisterOrderQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Бургер {number}", price=100 + number, image="burger.jpg")
+            for number in range(30)
+        )
+
+    def post_order(self, products):
+        payload = {
+            "payment": "cash",
+            "firstname": "Иван",
+            "lastname": "Петров",
+            "phonenumber": "+79291000000",
+            "address": "Москва, ул. Ленина, 1",
+            "products": [
+                {"product": product.id, "quantity": 2} for product in products
+            ],
+        }
+        return self.client.post(
+            "/api/order/", data=payload, content_type="application/json"
+        )
+
+    def test_query_count_does_not_depend_on_items_count(self):
+        # товары одним запросом, заказ и позиции - двумя INSERT в транзакции,
+        # позиции для ответа - одним SELECT
+        for items_count in (1, 10, 30):
+            with self.subTest(items_count=items_count):
+                with self.assertNumQueries(6):
+                    response = self.post_order(self.products[:items_count])
+                self.assertEqual(response.status_code, 201, response.content)
+
+    def test_items_saved_with_product_prices(self):
+        response = self.post_order(self.products[:3])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get(id=response.json()["id"])
+        self.assertEqual(
+            sorted(order.items.values_list("product_id", "price", "quantity")),
+            sorted((product.id, product.price, 2) for product in self.products[:3]),
+        )
+
+    def test_order_summary_saved_with_order(self):
+        response = self.post_order(self.products[:3])
+
+        order = Order.objects.get(id=response.json()["id"])
+        self.assertEqual(order.item_count, 6)
+        self.assertEqual(
+            order.total_price, sum(product.price * 2 for product in self.products[:3])
+        )
+        self.assertEqual(
+            order.product_ids, sorted(product.id for product in self.products[:3])
+        )
+
+    def test_unknown_product_rejected(self):
+        missing_product = Product(id=10_000)
+
+        response = self.post_order([self.products[0], missing_product])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("products", response.json())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class ProductListCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = Restaurant.objects.create(name="Star Burger")
+        cls.product = Product.objects.create(
+            name="Чизбургер", price=150, image="burger.jpg"
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.restaurant, product=cls.product
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_request_answered_with_not_modified(self):
+        response = self.client.get("/api/products/")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_content_served_when_accepted(self):
+        response = self.client.get("/api/products/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        products = json.loads(gzip.decompress(response.content))
+        self.assertEqual([product["id"] for product in products], [self.product.id])
+
+    def test_etag_depends_on_encoding(self):
+        plain = self.client.get("/api/products/")
+        compressed = self.client.get("/api/products/", HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertNotEqual(plain["ETag"], compressed["ETag"])
+        for response in (plain, compressed):
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+
+        # ETag сжатого ответа не подходит клиенту без gzip, и наоборот
+        response = self.client.get(
+            "/api/products/", HTTP_IF_NONE_MATCH=compressed["ETag"]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+        response = self.client.get(
+            "/api/products/",
+            HTTP_IF_NONE_MATCH=compressed["ETag"],
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_gzip_refused_by_qvalue(self):
+        for accept_encoding in ("gzip;q=0", "gzip; q=0.0, br", "*;q=0", "deflate"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(
+                    "/api/products/", HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertNotIn("Content-Encoding", response)
+                self.assertEqual(response.json()[0]["id"], self.product.id)
+
+        for accept_encoding in ("gzip;q=0.5", "br, *", "GZIP"):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(
+                    "/api/products/", HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_product_change_invalidates_snapshot(self):
+        etag = self.client.get("/api/products/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Двойной чизбургер"
+            self.product.save()
+
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["name"], "Двойной чизбургер")
+
+
+class OrderSummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(name="Бургер", price=100, image="a.jpg")
+        cls.fries = Product.objects.create(name="Картошка", price=50, image="b.jpg")
+        cls.order = Order.objects.create(
+            address="Москва", firstname="Иван", phonenumber="+79291000000"
+        )
+
+    def test_summary_follows_item_changes(self):
+        item = OrderItem.objects.create(
+            order=self.order, product=self.burger, price=100, quantity=2
+        )
+        OrderItem.objects.create(
+            order=self.order, product=self.fries, price=50, quantity=1
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, 250)
+        self.assertEqual(self.order.item_count, 3)
+        self.assertEqual(self.order.product_ids, [self.burger.id, self.fries.id])
+
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, 50)
+        self.assertEqual(self.order.product_ids, [self.fries.id])
+
+    def test_deferred_updates_recalculate_once(self):
+        with deferred_summary_updates():
+            OrderItem.objects.create(
+                order=self.order, product=self.burger, price=100, quantity=1
+            )
+            OrderItem.objects.create(
+                order=self.order, product=self.fries, price=50, quantity=1
+            )
+            self.order.refresh_from_db()
+            self.assertEqual(self.order.item_count, 0)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.item_count, 2)
+
+    def test_inconsistent_summary_found_and_fixed(self):
+        OrderItem.objects.create(
+            order=self.order, product=self.burger, price=100, quantity=1
+        )
+        Order.objects.filter(id=self.order.id).update(total_price=1)
+
+        self.assertIn(self.order.id, find_inconsistent_summaries([self.order.id]))
+        self.assertEqual(Order.objects.all().update_summaries(), 1)
+        self.assertEqual(find_inconsistent_summaries([self.order.id]), {})
+
+    def create_order(self, items_count):
+        order = Order.objects.create(
+            address="Москва", firstname="Иван", phonenumber="+79291000000"
+        )
+        with deferred_summary_updates():
+            for _ in range(items_count):
+                OrderItem.objects.create(
+                    order=order, product=self.burger, price=100, quantity=1
+                )
+        return order
+
+    def test_order_delete_skips_summary_updates(self):
+        for items_count in (1, 30):
+            order = self.create_order(items_count)
+            with self.subTest(items=items_count):
+                # Позиции, их удаление и удаление заказа, без пересчёта
+                # сводки на каждую позицию
+                with self.assertNumQueries(3):
+                    order.delete()
+                self.assertFalse(OrderItem.objects.filter(order=order.id).exists())
+
+        orders = [self.create_order(10) for _ in range(5)]
+        with self.assertNumQueries(4):
+            Order.objects.filter(id__in=[order.id for order in orders]).delete()
+
+    def test_items_queryset_delete_updates_summary_once(self):
+        order = self.create_order(30)
+        OrderItem.objects.create(
+            order=order, product=self.fries, price=50, quantity=1
+        )
+
+        # ID заказов, позиции и их удаление, затем один пересчёт сводки:
+        # заказ, его позиции и запись. Остальное - точки сохранения
+        with self.assertNumQueries(10):
+            order.items.filter(product=self.burger).delete()
+
+        order.refresh_from_db()
+        self.assertEqual(order.item_count, 1)
+        self.assertEqual(order.product_ids, [self.fries.id])
+
+    def test_migration_backfills_summaries(self):
+        migration = "0015_backfill_order_summaries"
+        backfill = import_module(f"foodcartapp.migrations.{migration}")
+        apps = MigrationLoader(connection).project_state(
+            ("foodcartapp", migration)
+        ).apps
+        OrderItem.objects.create(
+            order=self.order, product=self.burger, price=100, quantity=2
+        )
+        # Заказы, созданные до появления сводок
+        Order.objects.update(total_price=0, item_count=0, product_ids=[])
+
+        with patch.object(backfill, "BATCH_SIZE", 1):
+            backfill.backfill_order_summaries(apps, None)
+
+        self.assertEqual(find_inconsistent_summaries([self.order.id]), {})
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class QueriesBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin")
+        cls.category = ProductCategory.objects.create(name="Бургеры")
+
+    def setUp(self):
+        cache.clear()
+        self.data = DataSeeder(category=self.category)
+
+    def assert_constant_queries(self, expected_queries, request):
+        for restaurants_count, products_count, orders_count in DATA_SIZES:
+            self.data.seed(restaurants_count, products_count, orders_count)
+            with self.subTest(orders=orders_count, products=products_count):
+                cache.clear()
+                ContentType.objects.clear_cache()
+                with self.assertNumQueries(expected_queries):
+                    response = request()
+                self.assertEqual(response.status_code, 200)
+
+    def test_product_list_api(self):
+        # Сборка снимка каталога одним запросом при пустом кэше
+        self.assert_constant_queries(1, lambda: self.client.get("/api/products/"))
+
+    def test_order_admin_changelist(self):
+        self.client.force_login(self.admin)
+        # Сессия, пользователь, COUNT для пагинации, COUNT всех заказов, страница
+        self.assert_constant_queries(
+            5, lambda: self.client.get("/admin/foodcartapp/order/")
+        )
+
+    def test_order_admin_change_form(self):
+        self.client.force_login(self.admin)
+        # Сессия, пользователь, заказ, его товары для выбора ресторана,
+        # подходящие рестораны, товары для выпадающего списка (COUNT и SELECT),
+        # позиции с товарами и тип содержимого для истории изменений.
+        # Позиции последнего заказа - все товары, их число растёт с размером
+        self.assert_constant_queries(
+            9,
+            lambda: self.client.get(
+                f"/admin/foodcartapp/order/{self.data.orders[-1].id}/change/"
+            ),
+        )
+
+
+class RestaurantsIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.restaurants = [
+            Restaurant(id=number, name=f"Ресторан {number}", address=f"Адрес {number}")
+            for number in range(1, 5)
+        ]
+        coordinates = {
+            "Адрес 1": (55.75, 37.6),
+            "Адрес 2": (55.76, 37.6),
+            "Адрес 3": (55.9, 37.6),
+            # У ресторана 4 нет координат
+        }
+        menu_items = [(1, 10), (2, 10), (2, 20), (3, 10), (3, 20), (4, 10)]
+        self.index = RestaurantsIndex(self.restaurants, coordinates, menu_items)
+
+    def get_nearest(self, product_ids, limit=5):
+        return [
+            restaurant.id
+            for restaurant, _ in self.index.nearest((55.75, 37.6), product_ids, limit)
+        ]
+
+    def test_nearest_with_all_products(self):
+        self.assertEqual(self.get_nearest([10]), [1, 2, 3])
+        self.assertEqual(self.get_nearest([10, 20]), [2, 3])
+        self.assertEqual(self.get_nearest([10, 20], limit=1), [2])
+
+    def test_unknown_product(self):
+        self.assertEqual(self.get_nearest([10, 30]), [])
+
+    def test_empty_index(self):
+        index = RestaurantsIndex([], {}, [])
+
+        self.assertEqual(index.nearest((55.75, 37.6), [], 5), [])
+        self.assertEqual(index.nearest((55.75, 37.6), [10], 5), [])
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class NearestRestaurantsApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        for number, lat in enumerate([55.76, 55.9]):
+            address = f"Москва, Ресторанная, {number}"
+            Place.objects.create(address=address, lat=lat, lon=37.6)
+            restaurant = Restaurant.objects.create(
+                name=f"Ресторан {number}", address=address
+            )
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=cls.product
+            )
+        Place.objects.create(address="Москва, Заказная, 1", lat=55.75, lon=37.6)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_nearest(self, address):
+        return self.client.get(
+            "/api/restaurants/nearest/",
+            {"address": address, "products": str(self.product.id)},
+        )
+
+    def test_known_address(self):
+        response = self.get_nearest("Москва, Заказная, 1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [restaurant["name"] for restaurant in response.json()],
+            ["Ресторан 0", "Ресторан 1"],
+        )
+
+    def test_unknown_address_not_geocoded_in_request(self):
+        places_count = Place.objects.count()
+        with patch("places.geocoder.request_coordinates") as request_coordinates:
+            response = self.get_nearest("Москва, Новая, 1")
+
+        self.assertEqual(response.status_code, 202)
+        request_coordinates.assert_not_called()
+        self.assertEqual(Place.objects.count(), places_count)
+
+    def test_anonymous_requests_throttled(self):
+        rates = {"nearest_restaurants": "2/min"}
+        with patch.object(NearestRestaurantsThrottle, "THROTTLE_RATES", rates):
+            statuses = [
+                self.get_nearest("Москва, Заказная, 1").status_code for _ in range(3)
+            ]
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class BenchmarkSummaryTest(SimpleTestCase):
+    def test_percentiles_within_observed_range(self):
+        for timings in ([1.0, 2.0], list(range(1, 51)), [5.0] * 3 + [100.0]):
+            with self.subTest(samples=len(timings)):
+                summary = summarize(timings, errors=0)
+                percentiles = [summary[f"p{p}_ms"] for p in (50, 95, 99)]
+                self.assertEqual(percentiles, sorted(percentiles))
+                self.assertGreaterEqual(percentiles[0], summary["min_ms"])
+                self.assertLessEqual(percentiles[-1], summary["max_ms"])
+
+    def test_load_percentiles_within_observed_range(self):
+        latencies = [float(latency) for latency in range(1, 51)]
+        summary = load_api.summarize(latencies, {200: len(latencies)}, duration=1)
+
+        self.assertLessEqual(summary["p99_ms"], summary["max_ms"])
+        self.assertLessEqual(summary["p95_ms"], summary["p99_ms"])
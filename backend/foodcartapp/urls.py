@@ -1,7 +1,12 @@
 from django.urls import include
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    product_list_api,
+    banners_list_api,
+    register_order,
+    nearest_restaurants_api,
+)
 
 
 app_name = "foodcartapp"
@@ -10,5 +15,6 @@ urlpatterns = [
     path("products/", product_list_api),
     path("banners/", banners_list_api),
     path("order/", register_order),
+    path("restaurants/nearest/", nearest_restaurants_api),
     path("api-auth/", include("rest_framework.urls")),
 ]
@@ -1,12 +1,19 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.templatetags.static import static
 from django.db import transaction
-from rest_framework.decorators import api_view
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.throttling import AnonRateThrottle
 
-from .models import Product, Order, OrderItem
-from .serializers import OrderSerializer
+from places.geocoder import get_cached_coordinates
+
+from .catalog import get_catalog_snapshot
+from .models import Order, OrderItem
+from .restaurants_index import get_restaurants_index
+from .serializers import NearestRestaurantsQuerySerializer, OrderSerializer
 
 
 def banners_list_api(request):
@@ -37,40 +44,49 @@ def banners_list_api(request):
     )
 
 
+def _accepts_gzip(accept_encoding):
+    """
+    Разбирает заголовок Accept-Encoding с учётом q-значений: gzip;q=0
+    и *;q=0 без явного gzip запрещают сжатый ответ.
+    """
+    qvalues = {}
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        qvalue = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        if name:
+            qvalues[name.lower()] = qvalue
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
+
+
 def product_list_api(request):
-    products = Product.objects.select_related("category").available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "special_status": product.special_status,
-            "description": product.description,
-            "category": (
-                {
-                    "id": product.category.id,
-                    "name": product.category.name,
-                }
-                if product.category
-                else None
-            ),
-            "image": product.image.url,
-            "restaurant": {
-                "id": product.id,
-                "name": product.name,
-            },
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(
-        dumped_products,
-        safe=False,
-        json_dumps_params={
-            "ensure_ascii": False,
-            "indent": 4,
-        },
-    )
+    snapshot = get_catalog_snapshot()
+
+    # У сжатого и несжатого ответа разное содержимое, поэтому и ETag разные
+    use_gzip = _accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    if use_gzip:
+        etag = '{}-gzip"'.format(snapshot["etag"][:-1])
+        content = snapshot["gzip_content"]
+    else:
+        etag = snapshot["etag"]
+        content = snapshot["content"]
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type="application/json")
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
 
 
 @api_view(["POST"])
@@ -82,3 +98,59 @@ def register_order(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class NearestRestaurantsThrottle(AnonRateThrottle):
+    """
+    Каждый новый адрес уходит в платный геокодер, поэтому частота
+    запросов анонимов ограничена NEAREST_RESTAURANTS_THROTTLE_RATE.
+    """
+
+    scope = "nearest_restaurants"
+
+
+@api_view(["GET"])
+@throttle_classes([NearestRestaurantsThrottle])
+def nearest_restaurants_api(request):
+    """
+    Ближайшие к адресу рестораны, которые могут приготовить все товары
+    из products: /api/restaurants/nearest/?address=...&products=1,2&limit=5
+
+    Координаты берутся только из кэша и БД. Неизвестный адрес ставится
+    в очередь фонового геокодирования, а клиент получает 202 и повторяет
+    запрос позже.
+    """
+    query = NearestRestaurantsQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    address = query.validated_data["address"]
+    coordinates, pending = get_cached_coordinates([address])
+    if address in pending:
+        return Response(
+            {"detail": "Координаты адреса ещё определяются, повторите запрос позже."},
+            status=status.HTTP_202_ACCEPTED,
+        )
+    coords = coordinates.get(address)
+    if coords is None:
+        return Response(
+            {"address": ["Не удалось определить координаты адреса."]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    nearest = get_restaurants_index().nearest(
+        coords,
+        query.validated_data["products"],
+        query.validated_data["limit"],
+    )
+    return Response(
+        [
+            {
+                "id": restaurant.id,
+                "name": restaurant.name,
+                "address": restaurant.address,
+                "distance": distance,
+            }
+            for restaurant, distance in nearest
+        ]
+    )
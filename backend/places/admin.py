@@ -1,5 +1,10 @@
 from django.contrib import admin
+from django.db import transaction
+from functools import partial
+
+from .geocoder import invalidate_coordinates
 from .models import Place
+from .normalization import normalize_address
 
 
 @admin.register(Place)
@@ -7,9 +12,19 @@ class PlaceAdmin(admin.ModelAdmin):
     list_display = ["address", "lat", "lon", "updated_at"]
     list_filter = ["updated_at"]
     search_fields = ["address"]
-    readonly_fields = ["updated_at"]
+    readonly_fields = ["normalized_address", "updated_at"]
     ordering = ["-updated_at"]
 
     fieldsets = (
-        ("Информация о месте", {"fields": ("address", "lat", "lon", "updated_at")}),
+        (
+            "Информация о месте",
+            {"fields": ("address", "normalized_address", "lat", "lon", "updated_at")},
+        ),
     )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Новый ключ сбрасывает сигнал post_save, старый - здесь
+        if change and "address" in form.changed_data:
+            old_key = normalize_address(form.initial["address"])
+            transaction.on_commit(partial(invalidate_coordinates, old_key))
@@ -5,3 +5,6 @@ class PlacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'places'
     verbose_name = "Места и геокодирование"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,265 @@
+import csv
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError, RequestException
+
+logger = logging.getLogger(__name__)
+
+GEOCODER_ERRORS = (RequestException, KeyError, IndexError, ValueError)
+
+YANDEX_GEOCODER_URL = "https://geocode-maps.yandex.ru/1.x"
+
+# Таймауты установки соединения и чтения ответа, секунды
+GEOCODER_CONNECT_TIMEOUT = 3.05
+GEOCODER_READ_TIMEOUT = 10
+
+# Повторы при сбоях соединения, таймаутах и временных ошибках сервера
+GEOCODER_RETRIES = 2
+# Предел времени на геокодирование адреса вместе с повторами, секунды
+GEOCODER_TOTAL_TIMEOUT = GEOCODER_READ_TIMEOUT
+GEOCODER_BACKOFF_FACTOR = 0.2
+GEOCODER_RETRY_STATUSES = (502, 503, 504)
+
+
+def fetch_coordinates(
+    apikey, address, session=None, timeout=None, base_url=YANDEX_GEOCODER_URL
+):
+    """
+    Получает координаты через API Яндекса.
+    Если передана сессия requests, запрос идёт через её пул соединений.
+    """
+    response = (session or requests).get(
+        base_url,
+        params={
+            "geocode": address,
+            "apikey": apikey,
+            "format": "json",
+        },
+        timeout=timeout or (GEOCODER_CONNECT_TIMEOUT, GEOCODER_READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    found_places = response.json()["response"]["GeoObjectCollection"]["featureMember"]
+
+    if not found_places:
+        return None
+
+    most_relevant = found_places[0]
+    lon, lat = most_relevant["GeoObject"]["Point"]["pos"].split(" ")
+    return float(lat), float(lon)
+
+
+class GeocoderClient:
+    """
+    Клиент API Яндекс.Геокодера с пулом keep-alive соединений.
+
+    Все запросы идут через одну сессию requests, поэтому TCP- и TLS-рукопожатие
+    выполняются один раз на соединение пула, а не на каждый адрес. Запрос
+    повторяется при сбоях соединения, таймаутах и ответах
+    GEOCODER_RETRY_STATUSES с экспоненциальной задержкой, но все попытки
+    вместе с паузами укладываются в общий срок: переданный timeout или
+    total_timeout, если он меньше.
+    """
+
+    def __init__(
+        self,
+        apikey,
+        base_url=YANDEX_GEOCODER_URL,
+        pool_size=10,
+        retries=GEOCODER_RETRIES,
+        backoff_factor=GEOCODER_BACKOFF_FACTOR,
+        connect_timeout=GEOCODER_CONNECT_TIMEOUT,
+        read_timeout=GEOCODER_READ_TIMEOUT,
+        total_timeout=GEOCODER_TOTAL_TIMEOUT,
+    ):
+        self.apikey = apikey
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount(base_url, adapter)
+
+    def get_timeout(self, limit=None):
+        """Пара (connect, read) таймаутов, урезанная до limit секунд."""
+        if limit is None:
+            return (self.connect_timeout, self.read_timeout)
+        return (min(self.connect_timeout, limit), min(self.read_timeout, limit))
+
+    @staticmethod
+    def is_retryable(error):
+        if isinstance(error, HTTPError):
+            return error.response.status_code in GEOCODER_RETRY_STATUSES
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    def fetch_coordinates(self, address, timeout=None):
+        if timeout is None:
+            timeout = self.total_timeout
+        deadline = time.monotonic() + min(timeout, self.total_timeout)
+
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Истёк срок геокодирования адреса {address}")
+            try:
+                return fetch_coordinates(
+                    self.apikey,
+                    address,
+                    session=self.session,
+                    timeout=self.get_timeout(remaining),
+                    base_url=self.base_url,
+                )
+            except RequestException as error:
+                delay = self.backoff_factor * 2**attempt
+                if (
+                    attempt == self.retries
+                    or not self.is_retryable(error)
+                    or time.monotonic() + delay >= deadline
+                ):
+                    raise
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class YandexGeocoderBackend(GeocoderClient):
+    """
+    Бэкенд по умолчанию: HTTP API Яндекс.Геокодера.
+    Ключ берётся из YANDEX_GEOCODER_API_KEY, а пул соединений рассчитан
+    на все потоки геокодирования процесса.
+    """
+
+    def __init__(self, apikey=None, pool_size=None, **client_options):
+        if pool_size is None:
+            pool_size = (
+                settings.GEOCODER_MAX_WORKERS + settings.GEOCODER_BACKGROUND_WORKERS
+            )
+        super().__init__(
+            apikey or settings.YANDEX_GEOCODER_API_KEY,
+            pool_size=pool_size,
+            **client_options,
+        )
+
+    def geocode(self, address, timeout=None):
+        return self.fetch_coordinates(address, timeout=timeout)
+
+
+class GazetteerGeocoderBackend:
+    """
+    Офлайн-справочник известных адресов, целиком загруженный в память.
+
+    path - CSV-файл с колонками address, lat, lon или база SQLite
+    (расширения .sqlite, .sqlite3, .db), из которой адреса читаются
+    запросом query. Неизвестный адрес считается ненайденным.
+    """
+
+    SQLITE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+    def __init__(self, path, query="SELECT address, lat, lon FROM places"):
+        if path.endswith(self.SQLITE_EXTENSIONS):
+            with sqlite3.connect(path) as db:
+                rows = db.execute(query).fetchall()
+        else:
+            with open(path, encoding="utf-8", newline="") as csv_file:
+                rows = [
+                    (row["address"], row["lat"], row["lon"])
+                    for row in csv.DictReader(csv_file)
+                ]
+
+        self.places = {}
+        for address, lat, lon in rows:
+            has_coords = lat not in (None, "") and lon not in (None, "")
+            self.places[address.strip()] = (
+                (float(lat), float(lon)) if has_coords else None
+            )
+        logger.info(f"Справочник адресов {path}: загружено {len(self.places)} записей")
+
+    def geocode(self, address, timeout=None):
+        return self.places.get(address.strip())
+
+
+class ReplayGeocoderBackend:
+    """
+    Бэкенд для тестов и нагрузочных прогонов без сети.
+
+    В режиме воспроизведения отвечает из JSON-файла {адрес: [lat, lon] или null},
+    неизвестные адреса считаются ненайденными. С record=True запросы
+    передаются бэкенду upstream (путь к классу), а ответы дописываются в файл.
+
+    latency - задержка ответа в секундах (jitter - разброс вокруг неё),
+    error_rate - доля запросов, завершающихся ошибкой соединения. Если задержка
+    больше переданного таймаута, запрос завершается requests.Timeout -
+    так проверяются автомат и бюджет времени.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        record=False,
+        upstream="places.backends.YandexGeocoderBackend",
+        upstream_options=None,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        seed=None,
+    ):
+        self.path = path
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.responses = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as replay_file:
+                self.responses = json.load(replay_file)
+
+        self.upstream = None
+        if record:
+            self.upstream = import_string(upstream)(**(upstream_options or {}))
+
+    def geocode(self, address, timeout=None):
+        with self.lock:
+            delay = max(0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise requests.Timeout(f"Таймаут ответа для адреса {address}")
+        time.sleep(delay)
+        if fail:
+            raise requests.ConnectionError(f"Внедрённая ошибка для адреса {address}")
+
+        if self.record:
+            coords = self.upstream.geocode(address, timeout=timeout)
+            self.save_response(address, coords)
+            return coords
+
+        coords = self.responses.get(address)
+        return tuple(coords) if coords else None
+
+    def save_response(self, address, coords):
+        with self.lock:
+            self.responses[address] = list(coords) if coords else None
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as replay_file:
+                json.dump(self.responses, replay_file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
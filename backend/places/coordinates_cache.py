@@ -0,0 +1,171 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+# Маркер отсутствия значения в кэше
+MISSING = object()
+# Так в кэше хранится адрес, который геокодер не нашёл (отрицательный кэш)
+NOT_FOUND = "not_found"
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру кэш в памяти процесса с вытеснением давно
+    не использованных записей и сроком жизни каждой записи.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return MISSING
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if self.maxsize <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CoordinatesCache:
+    """
+    Двухуровневый кэш координат перед таблицей Place.
+
+    Первый уровень - LRU в памяти процесса, второй - кэш Django (CACHES),
+    общий для процессов при общем бэкенде. Ключ - нормализованный адрес,
+    значение - (широта, долгота) или None для адреса, который геокодер
+    не нашёл. Срок жизни записи не больше оставшегося срока свежести места
+    и не больше local_timeout / shared_timeout своего уровня: правки Place
+    в других процессах видны не позже чем через local_timeout.
+    """
+
+    key_prefix = "places:coordinates:"
+
+    def __init__(self, local_size, local_timeout, shared_timeout):
+        self.local = LRUCache(local_size)
+        self.local_timeout = local_timeout
+        self.shared_timeout = shared_timeout
+
+        self.stats_lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get_shared_key(self, key):
+        # Адрес содержит пробелы и кириллицу, недопустимые в ключах memcached
+        return self.key_prefix + hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    def count(self, local_hits=0, shared_hits=0, misses=0):
+        with self.stats_lock:
+            self.local_hits += local_hits
+            self.shared_hits += shared_hits
+            self.misses += misses
+
+    def get(self, key):
+        """Возвращает координаты или MISSING, если адреса нет в кэше."""
+        return self.get_many([key]).get(key, MISSING)
+
+    def get_many(self, keys):
+        """Возвращает словарь {ключ: координаты} для найденных в кэше ключей."""
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is MISSING:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+        local_hits = len(found)
+
+        shared_values = {}
+        if remote_keys:
+            shared_values = cache.get_many(
+                [self.get_shared_key(key) for key in remote_keys]
+            )
+        for key in remote_keys:
+            value = shared_values.get(self.get_shared_key(key), MISSING)
+            if value is not MISSING:
+                self.local.set(key, value, self.local_timeout)
+                found[key] = value
+
+        self.count(
+            local_hits=local_hits,
+            shared_hits=len(found) - local_hits,
+            misses=len(keys) - len(found),
+        )
+        return {
+            key: None if value == NOT_FOUND else tuple(value)
+            for key, value in found.items()
+        }
+
+    def set(self, key, coords, timeout):
+        self.set_many({key: (coords, timeout)})
+
+    def set_many(self, entries):
+        """
+        Сохраняет записи {ключ: (координаты, timeout в секундах)}.
+        Записи с одинаковым итоговым сроком уходят в кэш Django одним set_many.
+        """
+        shared_batches = {}
+        for key, (coords, timeout) in entries.items():
+            if timeout <= 0:
+                continue
+            value = coords or NOT_FOUND
+            self.local.set(key, value, min(timeout, self.local_timeout))
+            shared_timeout = int(min(timeout, self.shared_timeout)) or 1
+            batch = shared_batches.setdefault(shared_timeout, {})
+            batch[self.get_shared_key(key)] = value
+
+        for shared_timeout, batch in shared_batches.items():
+            cache.set_many(batch, timeout=shared_timeout)
+
+    def delete(self, key):
+        self.local.delete(key)
+        cache.delete(self.get_shared_key(key))
+
+    def get_stats(self):
+        with self.stats_lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            hits = self.local_hits + self.shared_hits
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "local_size": len(self.local),
+            }
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.local_hits = self.shared_hits = self.misses = 0
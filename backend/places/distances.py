@@ -0,0 +1,145 @@
+from django.apps import apps
+from django.db.models import Q
+
+from .geocoder import calculate_distances
+from .models import Place, RestaurantDistance
+from .normalization import normalize_address
+
+
+def _get_coordinates(lat, lon):
+    if lat is None or lon is None:
+        return None
+    return (lat, lon)
+
+
+def get_restaurant_distances(pairs):
+    """
+    Возвращает расстояния в км между ресторанами и адресами.
+
+    pairs - пары (ресторан, адрес), результат - словарь
+    {(restaurant_id, адрес): км или None, если у ресторана или адреса
+    нет координат}.
+
+    Расстояния берутся из таблицы RestaurantDistance одним запросом.
+    Недостающие считаются по координатам из Place и сохраняются одним
+    bulk_create, поэтому повторные запросы расчётов не требуют.
+    Пары, у которых адреса ещё нет в Place, не сохраняются.
+    """
+    pairs = [
+        (restaurant, address, normalize_address(address))
+        for restaurant, address in pairs
+        if address and address.strip()
+    ]
+    if not pairs:
+        return {}
+
+    stored = {
+        (restaurant_id, key): distance
+        for restaurant_id, key, distance in RestaurantDistance.objects.filter(
+            restaurant_id__in={restaurant.id for restaurant, _, _ in pairs},
+            place__normalized_address__in={key for _, _, key in pairs},
+        ).values_list("restaurant_id", "place__normalized_address", "distance")
+    }
+
+    missing = {
+        (restaurant.id, key): restaurant
+        for restaurant, _, key in pairs
+        if (restaurant.id, key) not in stored
+    }
+    if missing:
+        stored.update(_calculate_distances(missing))
+
+    return {
+        (restaurant.id, address): stored.get((restaurant.id, key))
+        for restaurant, address, key in pairs
+    }
+
+
+def _calculate_distances(missing):
+    """
+    Считает расстояния для пар {(restaurant_id, ключ адреса): ресторан}
+    по координатам из Place и сохраняет их в RestaurantDistance.
+    """
+    restaurant_keys = {
+        restaurant.id: normalize_address(restaurant.address)
+        for restaurant in missing.values()
+        if restaurant.address and restaurant.address.strip()
+    }
+    places = {
+        key: (place_id, _get_coordinates(lat, lon))
+        for place_id, key, lat, lon in Place.objects.filter(
+            normalized_address__in={key for _, key in missing}
+            | set(restaurant_keys.values())
+        ).values_list("id", "normalized_address", "lat", "lon")
+    }
+
+    # Одна матрица адреса x рестораны вместо расчёта по каждой паре
+    origin_keys = sorted({key for _, key in missing})
+    restaurant_ids = sorted({restaurant_id for restaurant_id, _ in missing})
+    matrix = calculate_distances(
+        [places.get(key, (None, None))[1] for key in origin_keys],
+        [
+            places.get(restaurant_keys.get(restaurant_id), (None, None))[1]
+            for restaurant_id in restaurant_ids
+        ],
+    )
+    origin_rows = dict(zip(origin_keys, matrix))
+    restaurant_columns = {
+        restaurant_id: column for column, restaurant_id in enumerate(restaurant_ids)
+    }
+
+    distances = {}
+    new_distances = []
+    for restaurant_id, key in missing:
+        place_id, _ = places.get(key, (None, None))
+        distance = origin_rows[key][restaurant_columns[restaurant_id]]
+        distances[(restaurant_id, key)] = distance
+        if place_id is not None:
+            new_distances.append(
+                RestaurantDistance(
+                    restaurant_id=restaurant_id, place_id=place_id, distance=distance
+                )
+            )
+
+    RestaurantDistance.objects.bulk_create(new_distances, ignore_conflicts=True)
+    return distances
+
+
+def _get_restaurant_ids(keys):
+    """ID ресторанов, адреса которых нормализуются в один из keys."""
+    restaurant_model = apps.get_model("foodcartapp", "Restaurant")
+    return [
+        restaurant_id
+        for restaurant_id, address in restaurant_model.objects.values_list(
+            "id", "address"
+        )
+        if address and normalize_address(address) in keys
+    ]
+
+
+def invalidate_distances(keys):
+    """
+    Удаляет сохранённые расстояния до мест с ключами keys и от ресторанов,
+    расположенных по этим адресам. Вызывается при массовом изменении
+    координат Place.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+
+    RestaurantDistance.objects.filter(
+        Q(place__normalized_address__in=keys)
+        | Q(restaurant_id__in=_get_restaurant_ids(keys))
+    ).delete()
+
+
+def invalidate_place_distances(place_id, key):
+    """
+    Удаляет расстояния, зависящие от одного места: до него - по внешнему
+    ключу, и от ресторанов по его адресу. У удалённого места расстояния
+    до него уже удалены каскадом, тогда place_id - None.
+    """
+    distances = Q(restaurant_id__in=_get_restaurant_ids({key}))
+    if place_id is not None:
+        distances |= Q(place_id=place_id)
+    RestaurantDistance.objects.filter(distances).delete()
@@ -1,36 +1,276 @@
-import requests
+import hashlib
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Q
+from django.dispatch import Signal
 from geopy.distance import geodesic
 import logging
 from django.utils import timezone
-from requests.exceptions import RequestException
+from django.utils.module_loading import import_string
+from star_burger.request_timings import timing
 
+from .backends import GEOCODER_ERRORS
+from .coordinates_cache import MISSING, CoordinatesCache
+from .snapshot import SnapshotLoader, mark_snapshot_outdated
 from .models import Place
+from .normalization import normalize_address
 
 logger = logging.getLogger(__name__)
 
+# Средний радиус Земли (IUGG)
+EARTH_RADIUS_KM = 6371.0088
 
-def fetch_coordinates(apikey, address):
-    """Получает координаты через API Яндекса."""
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(
-        base_url,
-        params={
-            "geocode": address,
-            "apikey": apikey,
-            "format": "json",
-        },
-        timeout=10,
-    )
-    response.raise_for_status()
-    found_places = response.json()["response"]["GeoObjectCollection"]["featureMember"]
+GEOCODE_OK = "ok"
+GEOCODE_FAILED = "failed"
+GEOCODE_SKIPPED = "skipped"
+
+# Сколько ждать, пока адрес геокодирует другой процесс, и как часто проверять
+GEOCODER_LOCK_TIMEOUT = 15
+GEOCODER_LOCK_POLL_INTERVAL = 0.1
+
+PLACES_CHANGED_AT_KEY = "places:changed_at"
+
+# Отправляется, когда координаты мест изменены в обход сигналов модели
+# (bulk_create, bulk_update). keys - нормализованные адреса мест
+coordinates_changed = Signal()
+
+
+class RateLimiter:
+    """
+    Ограничивает частоту запросов: не больше rate в секунду суммарно
+    для всех потоков, которые вызывают wait(). rate = 0 снимает ограничение.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Общий для процесса ограничитель частоты запросов к API Яндекса."""
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(settings.GEOCODER_RATE_LIMIT)
+    return _rate_limiter
+
+
+def set_rate_limit(rate):
+    """Меняет лимит запросов в секунду для всего процесса."""
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        _rate_limiter = RateLimiter(rate)
+
+
+class GeocoderUnavailable(Exception):
+    """Геокодер не вызывался: открыт автомат или исчерпан бюджет времени."""
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для API геокодера.
+
+    После failure_threshold ошибок подряд (включая таймауты) автомат
+    размыкается, и на cooldown секунд запросы к API не выполняются -
+    геокодер работает только по кэшу. Затем пропускается один пробный
+    запрос: успех замыкает автомат, ошибка снова размыкает его.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at >= self.cooldown:
+                    self.state = self.HALF_OPEN
+                    return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.warning("Автомат геокодера замкнут, запросы к API возобновлены")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        f"Автомат геокодера разомкнут после {self.failures} ошибок "
+                        f"подряд, запросы к API остановлены на {self.cooldown} с"
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def get_state(self):
+        with self.lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                retry_in = round(max(0, self.cooldown - elapsed), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown": self.cooldown,
+                "retry_in": retry_in,
+            }
+
+
+_circuit_breaker = None
+_circuit_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Общий для процесса автомат геокодера."""
+    global _circuit_breaker
+
+    with _circuit_breaker_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker(
+                settings.GEOCODER_BREAKER_THRESHOLD,
+                settings.GEOCODER_BREAKER_COOLDOWN,
+            )
+    return _circuit_breaker
+
+
+_budget = threading.local()
 
-    if not found_places:
+
+@contextmanager
+def geocoding_budget(seconds=None):
+    """
+    Ограничивает суммарное время всех запросов к геокодеру в текущем потоке,
+    например, за один HTTP-запрос. Работает и как декоратор view:
+
+        @geocoding_budget()
+        def view_orders(request): ...
+
+    По умолчанию бюджет равен GEOCODER_REQUEST_BUDGET секунд. Когда бюджет
+    исчерпан, геокодер отвечает только из кэша.
+    """
+    if seconds is None:
+        seconds = settings.GEOCODER_REQUEST_BUDGET
+
+    previous_deadline = getattr(_budget, "deadline", None)
+    deadline = time.monotonic() + seconds
+    if previous_deadline is not None:
+        deadline = min(deadline, previous_deadline)
+
+    _budget.deadline = deadline
+    try:
+        yield
+    finally:
+        _budget.deadline = previous_deadline
+
+
+def _get_budget_deadline():
+    """Момент time.monotonic(), когда кончится бюджет, или None."""
+    return getattr(_budget, "deadline", None)
+
+
+def _get_request_timeout():
+    """Остаток бюджета времени в секундах или None, если бюджета нет."""
+    deadline = _get_budget_deadline()
+    if deadline is None:
         return None
 
-    most_relevant = found_places[0]
-    lon, lat = most_relevant["GeoObject"]["Point"]["pos"].split(" ")
-    return float(lat), float(lon)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise GeocoderUnavailable("Бюджет времени на геокодирование исчерпан")
+    return remaining
+
+
+def request_coordinates(address):
+    """
+    Запрашивает координаты у API с учётом автомата, бюджета времени
+    и ограничения частоты. Если API вызывать нельзя, бросает
+    GeocoderUnavailable, ошибки самого API пробрасываются как есть.
+    """
+    timeout = _get_request_timeout()
+    circuit_breaker = get_circuit_breaker()
+    if not circuit_breaker.allow_request():
+        raise GeocoderUnavailable("Автомат геокодера разомкнут")
+
+    get_rate_limiter().wait()
+    try:
+        coords = get_geocoder_backend().geocode(address, timeout=timeout)
+    except GEOCODER_ERRORS:
+        circuit_breaker.record_failure()
+        raise
+
+    circuit_breaker.record_success()
+    return coords
+
+
+_geocoder_backend = None
+_geocoder_backend_lock = threading.Lock()
+
+
+def get_geocoder_backend():
+    """
+    Общий для процесса бэкенд геокодирования: класс из GEOCODER_BACKEND,
+    созданный с параметрами GEOCODER_BACKEND_OPTIONS.
+    """
+    global _geocoder_backend
+
+    with _geocoder_backend_lock:
+        if _geocoder_backend is None:
+            backend_class = import_string(settings.GEOCODER_BACKEND)
+            _geocoder_backend = backend_class(**settings.GEOCODER_BACKEND_OPTIONS)
+    return _geocoder_backend
+
+
+def reset_geocoder_backend():
+    """Следующий get_geocoder_backend создаст бэкенд по текущим настройкам."""
+    global _geocoder_backend
+
+    with _geocoder_backend_lock:
+        _geocoder_backend = None
 
 
 def calculate_distance(coord1, coord2):
@@ -43,55 +283,607 @@ def calculate_distance(coord1, coord2):
     return round(geodesic(coord1, coord2).km, 3)
 
 
-def get_or_create_coordinates(address):
+def _prepare_coordinates(coords):
+    """Переводит (широта, долгота) в радианы и заранее считает косинус широты."""
+    lat, lon = math.radians(coords[0]), math.radians(coords[1])
+    return lat, lon, math.cos(lat)
+
+
+def calculate_distances(origins, destinations, exact=False):
     """
-    Получает координаты адреса из БД или API Яндекса.
-    Кэширует результат в БД.
+    Рассчитывает матрицу расстояний в км между списками точек.
+
+    origins и destinations - списки кортежей (широта, долгота) или None.
+    Возвращает список строк: matrix[i][j] - расстояние от origins[i]
+    до destinations[j], None если у одной из точек нет координат.
+
+    По умолчанию используется формула гаверсинусов на сфере радиусом
+    EARTH_RADIUS_KM: тригонометрия для каждой точки считается один раз,
+    а не для каждой пары. Относительная погрешность по сравнению
+    с geodesic (эллипсоид WGS-84) не превышает 0.6%, на широтах Москвы -
+    0.35% (около 35 м на 10 км), чего достаточно для сортировки ресторанов.
+    С exact=True расстояния считаются через geodesic, как calculate_distance.
     """
-    if not address or not address.strip():
+    if exact:
+        return [
+            [calculate_distance(origin, destination) for destination in destinations]
+            for origin in origins
+        ]
+
+    prepared_destinations = [
+        _prepare_coordinates(destination) if destination else None
+        for destination in destinations
+    ]
+
+    matrix = []
+    for origin in origins:
+        if not origin:
+            matrix.append([None] * len(prepared_destinations))
+            continue
+
+        lat1, lon1, cos_lat1 = _prepare_coordinates(origin)
+        row = []
+        for destination in prepared_destinations:
+            if destination is None:
+                row.append(None)
+                continue
+
+            lat2, lon2, cos_lat2 = destination
+            haversine = (
+                math.sin((lat2 - lat1) / 2) ** 2
+                + cos_lat1 * cos_lat2 * math.sin((lon2 - lon1) / 2) ** 2
+            )
+            distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(haversine)))
+            row.append(round(distance, 3))
+        matrix.append(row)
+
+    return matrix
+
+
+def _get_place_coordinates(place):
+    if place.lat is None or place.lon is None:
         return None
+    return (place.lat, place.lon)
+
+
+def _get_fresh_seconds(place):
+    """
+    Сколько секунд координаты места ещё свежие (отрицательное - устарели).
+    Положительный результат (есть координаты) живёт GEOCODER_CACHE_DAYS,
+    отрицательный (адрес не найден) - GEOCODER_NEGATIVE_CACHE_HOURS.
+    """
+    if _get_place_coordinates(place):
+        ttl = timedelta(days=settings.GEOCODER_CACHE_DAYS)
+    else:
+        ttl = timedelta(hours=settings.GEOCODER_NEGATIVE_CACHE_HOURS)
+    return (place.updated_at + ttl - timezone.now()).total_seconds()
+
+
+def _is_fresh(place):
+    return _get_fresh_seconds(place) > 0
+
+
+_coordinates_cache = None
+_coordinates_cache_lock = threading.Lock()
+
+
+def get_coordinates_cache():
+    """Общий для процесса двухуровневый кэш координат."""
+    global _coordinates_cache
+
+    with _coordinates_cache_lock:
+        if _coordinates_cache is None:
+            _coordinates_cache = CoordinatesCache(
+                local_size=settings.GEOCODER_LOCAL_CACHE_SIZE,
+                local_timeout=settings.GEOCODER_LOCAL_CACHE_TIMEOUT,
+                shared_timeout=settings.GEOCODER_SHARED_CACHE_TIMEOUT,
+            )
+    return _coordinates_cache
+
+
+def _cache_places(places):
+    """Кладёт в кэш координаты свежих мест до конца их срока свежести."""
+    get_coordinates_cache().set_many(
+        {
+            place.normalized_address: (
+                _get_place_coordinates(place),
+                _get_fresh_seconds(place),
+            )
+            for place in places
+        }
+    )
+
+
+def invalidate_coordinates(key):
+    """Удаляет координаты нормализованного адреса из кэша."""
+    get_coordinates_cache().delete(key)
+    mark_places_changed()
+
+
+def mark_places_changed():
+    """
+    Запоминает время последнего изменения Place. Если оно позже выгрузки
+    снимка координат, найденное в снимке сверяется с БД.
+
+    Время пишется в кэш и в метку рядом с файлом снимка: кэш по умолчанию
+    локальный для процесса, а mtime метки видят все воркеры на сервере.
+    """
+    cache.set(PLACES_CHANGED_AT_KEY, time.time(), timeout=None)
+    if settings.GEOCODER_SNAPSHOT_PATH:
+        mark_snapshot_outdated(settings.GEOCODER_SNAPSHOT_PATH)
+
+
+def _get_places_changed_at():
+    changed_at = cache.get(PLACES_CHANGED_AT_KEY)
+    if changed_at is None:
+        last_update = Place.objects.aggregate(last=Max("updated_at"))["last"]
+        changed_at = last_update.timestamp() if last_update else 0
+        cache.add(PLACES_CHANGED_AT_KEY, changed_at, timeout=None)
+    # Изменения из других процессов видны по метке снимка
+    return max(changed_at, _get_snapshot_loader().changed_at)
+
+
+_snapshot_loader = None
+_snapshot_loader_lock = threading.Lock()
+
+
+def _get_snapshot_loader():
+    global _snapshot_loader
+
+    with _snapshot_loader_lock:
+        if _snapshot_loader is None:
+            _snapshot_loader = SnapshotLoader(settings.GEOCODER_SNAPSHOT_PATH)
+    return _snapshot_loader
+
+
+def get_coordinates_snapshot():
+    """Снимок координат из GEOCODER_SNAPSHOT_PATH или None, если его нет."""
+    return _get_snapshot_loader().get()
+
+
+def _find_in_snapshot(keys):
+    """
+    Ищет адреса в снимке координат. Возвращает пару (entries, changed_since):
+    entries - словарь {ключ: SnapshotEntry}, changed_since - время выгрузки
+    снимка, если после неё Place менялись и записи Place новее этого времени
+    важнее снимка, иначе None.
+    """
+    snapshot = get_coordinates_snapshot()
+    if snapshot is None or not keys:
+        return {}, None
+
+    entries = {}
+    for key in keys:
+        entry = snapshot.get(key)
+        if entry is not None:
+            entries[key] = entry
+    if not entries:
+        return {}, None
+
+    changed_since = None
+    if _get_places_changed_at() > snapshot.created_at.timestamp():
+        changed_since = snapshot.created_at
+    return entries, changed_since
+
+
+def _get_address_hash(key):
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def _get_failure_key(key):
+    return f"places:geocoder:failed:{_get_address_hash(key)}"
+
+
+def _get_lock_key(key):
+    return f"places:geocoder:lock:{_get_address_hash(key)}"
+
+
+def _remember_failure(key):
+    """
+    Запоминает ошибку геокодирования в кэше, а не в БД: адрес не будет
+    запрашиваться повторно GEOCODER_NEGATIVE_CACHE_HOURS, а устаревшие
+    координаты в Place остаются как есть.
+    """
+    timeout = settings.GEOCODER_NEGATIVE_CACHE_HOURS * 60 * 60
+    cache.set(_get_failure_key(key), True, timeout=timeout)
+
+
+def _has_recent_failure(key):
+    return cache.get(_get_failure_key(key), False)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом внутри процесса:
+    функцию выполняет первый вызвавший поток, остальные ждут его результат
+    (или получают его исключение).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self.calls[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+_single_flight = SingleFlight()
+
+
+def _fetch_and_store(address, key, force):
+    place = Place.objects.filter(normalized_address=key).first()
+    if not force and _has_recent_failure(key):
+        return _get_place_coordinates(place) if place else None
 
     try:
-        place = Place.objects.get(address=address)
+        coords = request_coordinates(address)
+    except GeocoderUnavailable:
+        return _get_place_coordinates(place) if place else None
+    except GEOCODER_ERRORS as e:
+        logger.warning(f"Ошибка геокодирования для адреса {address}: {e}")
+        _remember_failure(key)
+
+        if place is None:
+            place, _ = Place.objects.get_or_create(
+                normalized_address=key,
+                defaults={"address": address, "lat": None, "lon": None},
+            )
+        return _get_place_coordinates(place)
+
+    if coords is None and place is not None and _get_place_coordinates(place):
+        # "Не найдено" при обновлении не стирает известные координаты,
+        # адрес просто не запрашивается повторно какое-то время
+        _remember_failure(key)
+        return _get_place_coordinates(place)
+
+    lat, lon = coords or (None, None)
+    place, _ = Place.objects.update_or_create(
+        normalized_address=key,
+        defaults={"lat": lat, "lon": lon},
+        create_defaults={"address": address, "lat": lat, "lon": lon},
+    )
+    _cache_places([place])
+    return coords
 
-        if place.lat and place.lon:
-            days_old = (timezone.now() - place.updated_at).days
-            if days_old < 30:
-                return (place.lat, place.lon)
 
+def _fetch_and_store_with_lock(address, key, force):
+    """
+    Межпроцессная блокировка адреса через cache.add: если адрес уже
+    геокодирует другой процесс, ждём снятия блокировки, но не дольше
+    бюджета geocoding_budget, и читаем результат из Place. Работает между
+    процессами при общем бэкенде кэша (CACHE_URL).
+    """
+    lock_key = _get_lock_key(key)
+    if cache.add(lock_key, True, timeout=GEOCODER_LOCK_TIMEOUT):
         try:
-            coords = fetch_coordinates(settings.YANDEX_GEOCODER_API_KEY, address)
-        except (RequestException, KeyError, IndexError, ValueError) as e:
-            logger.warning(f"Ошибка геокодирования для адреса {address}: {e}")
+            return _fetch_and_store(address, key, force)
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + GEOCODER_LOCK_TIMEOUT
+    budget_deadline = _get_budget_deadline()
+    if budget_deadline is not None:
+        deadline = min(deadline, budget_deadline)
+    while cache.get(lock_key) and time.monotonic() < deadline:
+        time.sleep(GEOCODER_LOCK_POLL_INTERVAL)
+
+    place = Place.objects.filter(normalized_address=key).first()
+    return _get_place_coordinates(place) if place else None
+
+
+@timing("geocoder")
+def refresh_coordinates(address, force=False):
+    """
+    Запрашивает координаты адреса у API Яндекса и сохраняет их в Place.
+
+    Адреса сравниваются по normalize_address, поэтому варианты написания
+    одного адреса используют одну запись Place.
+
+    Одновременно для одного адреса выполняется не больше одного запроса
+    к API: остальные вызовы в процессе и в других процессах ждут его
+    результат. Гонки при вставке Place обрабатываются через
+    get_or_create / update_or_create.
+
+    При ошибке API существующая запись не меняется. Новый адрес сохраняется
+    без координат, чтобы не запрашивать его снова до истечения
+    отрицательного TTL. Если адрес недавно уже не удалось геокодировать,
+    API не вызывается, пока не передан force=True.
+    """
+    key = normalize_address(address)
+    return _single_flight.do(
+        key, partial(_fetch_and_store_with_lock, address, key, force)
+    )
 
-            place.save()
-            return (place.lat, place.lon) if place.lat and place.lon else None
 
-        if coords:
-            place.lat, place.lon = coords
-            place.save()
-            return coords
+@timing("geocoder")
+def get_or_create_coordinates(address):
+    """
+    Получает координаты адреса из кэша, снимка координат, БД или API Яндекса.
+    Кэширует результат в БД, свежие координаты - ещё и в get_coordinates_cache.
+
+    Устаревшие координаты возвращаются сразу, а обновление ставится
+    в очередь фонового геокодирования (stale-while-revalidate).
+    Синхронно API вызывается только для адреса, которого ещё нет в БД.
+    """
+    if not address or not address.strip():
+        return None
+
+    key = normalize_address(address)
+    coords = get_coordinates_cache().get(key)
+    if coords is not MISSING:
+        return coords
+
+    entries, changed_since = _find_in_snapshot([key])
+    place = None
+    if changed_since:
+        # Запись снимка заменяет только Place этого адреса, изменённая
+        # после выгрузки
+        place = Place.objects.filter(
+            normalized_address=key, updated_at__gt=changed_since
+        ).first()
+    if entries and place is None:
+        if not _is_fresh(entries[key]):
+            schedule_geocoding([address])
+        return _get_place_coordinates(entries[key])
+
+    if not entries:
+        place = Place.objects.filter(normalized_address=key).first()
+    if place is None:
+        return refresh_coordinates(address)
+
+    if _is_fresh(place):
+        _cache_places([place])
+    else:
+        schedule_geocoding([address])
+    return _get_place_coordinates(place)
+
+
+def get_coordinates(address):
+    """Алиас для обратной совместимости"""
+    return get_or_create_coordinates(address)
+
+
+@timing("geocoder")
+def geocode_many(addresses, refresh=False, workers=None, statuses=None):
+    """
+    Получает координаты сразу для многих адресов.
+
+    Свежие координаты, а также координаты адресов с недавней ошибкой
+    геокодирования берутся из Place, остальные адреса запрашиваются
+    у API Яндекса параллельно в пуле из workers потоков (по умолчанию
+    GEOCODER_MAX_WORKERS) через общий клиент с пулом соединений. Частота запросов
+    ограничена GEOCODER_RATE_LIMIT в секунду. С refresh=True запрашиваются
+    все адреса, даже со свежими координатами.
+
+    Пока автомат геокодера разомкнут, API не вызывается, и для
+    незакэшированных адресов возвращаются прежние значения.
+
+    Новые записи Place создаются одним bulk_create, изменённые сохраняются
+    одним bulk_update. Варианты написания одного адреса геокодируются
+    один раз. Возвращает словарь {адрес: (широта, долгота) или None}.
+
+    В переданный словарь statuses записываются итоги запросов к API:
+    {адрес: GEOCODE_OK, GEOCODE_FAILED или GEOCODE_SKIPPED}. Адреса,
+    взятые из Place без запроса, в него не попадают.
+    """
+    addresses_by_key = {}
+    for address in addresses:
+        if address and address.strip():
+            addresses_by_key.setdefault(normalize_address(address), []).append(address)
+
+    places = {
+        place.normalized_address: place
+        for place in Place.objects.filter(normalized_address__in=addresses_by_key)
+    }
+
+    coords_by_key = {}
+    keys_to_fetch = []
+    for key in addresses_by_key:
+        place = places.get(key)
+        use_cached = place and (_is_fresh(place) or _has_recent_failure(key))
+        if use_cached and not refresh:
+            coords_by_key[key] = _get_place_coordinates(place)
         else:
-            place.save()
-            return None
+            keys_to_fetch.append(key)
+
+    workers = workers or settings.GEOCODER_MAX_WORKERS
 
-    except Place.DoesNotExist:
+    def fetch(key):
+        address = addresses_by_key[key][0]
         try:
-            coords = fetch_coordinates(settings.YANDEX_GEOCODER_API_KEY, address)
-        except (RequestException, KeyError, IndexError, ValueError) as e:
+            coords = request_coordinates(address)
+        except GeocoderUnavailable:
+            return key, None, GEOCODE_SKIPPED
+        except GEOCODER_ERRORS as e:
             logger.warning(f"Ошибка геокодирования для адреса {address}: {e}")
+            return key, None, GEOCODE_FAILED
+        return key, coords, GEOCODE_OK
+
+    fetched = []
+    if keys_to_fetch:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = list(executor.map(fetch, keys_to_fetch))
 
-            Place.objects.create(address=address, lat=None, lon=None)
-            return None
+    now = timezone.now()
+    places_to_create = []
+    places_to_update = []
+    for key, coords, status in fetched:
+        if statuses is not None:
+            for address in addresses_by_key[key]:
+                statuses[address] = status
+        place = places.get(key)
+        if status == GEOCODE_SKIPPED:
+            coords_by_key[key] = _get_place_coordinates(place) if place else None
+            continue
+        if status == GEOCODE_FAILED:
+            _remember_failure(key)
 
-        if coords:
-            place = Place.objects.create(address=address, lat=coords[0], lon=coords[1])
-            return coords
+        if place is None:
+            lat, lon = coords or (None, None)
+            places_to_create.append(
+                Place(
+                    address=addresses_by_key[key][0],
+                    normalized_address=key,
+                    lat=lat,
+                    lon=lon,
+                )
+            )
+            coords_by_key[key] = coords
+        elif status == GEOCODE_FAILED:
+            coords_by_key[key] = _get_place_coordinates(place)
+        elif coords is None and _get_place_coordinates(place):
+            # Как и в _fetch_and_store, пустой ответ не стирает координаты
+            _remember_failure(key)
+            coords_by_key[key] = _get_place_coordinates(place)
         else:
-            Place.objects.create(address=address, lat=None, lon=None)
-            return None
+            place.lat, place.lon = coords or (None, None)
+            place.updated_at = now
+            places_to_update.append(place)
+            coords_by_key[key] = coords
 
+    Place.objects.bulk_create(places_to_create, ignore_conflicts=True)
+    Place.objects.bulk_update(places_to_update, ["lat", "lon", "updated_at"])
+    # bulk-операции не отправляют сигналы, поэтому кэш обновляется здесь
+    changed_places = places_to_create + places_to_update
+    _cache_places(changed_places)
+    if changed_places:
+        mark_places_changed()
+        coordinates_changed.send(
+            sender=Place,
+            keys=[place.normalized_address for place in changed_places],
+        )
 
-def get_coordinates(address):
-    """Алиас для обратной совместимости"""
-    return get_or_create_coordinates(address)
+    return {
+        address: coords_by_key[key]
+        for key, key_addresses in addresses_by_key.items()
+        for address in key_addresses
+    }
+
+
+_background_executor = None
+_background_addresses = set()
+_background_lock = threading.Lock()
+
+
+def _get_background_executor():
+    global _background_executor
+
+    with _background_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(
+                max_workers=settings.GEOCODER_BACKGROUND_WORKERS,
+                thread_name_prefix="geocoder",
+            )
+    return _background_executor
+
+
+def _geocode_in_background(address, key):
+    try:
+        refresh_coordinates(address)
+    except Exception:
+        logger.exception(f"Ошибка фонового геокодирования адреса {address}")
+    finally:
+        connection.close()
+        with _background_lock:
+            _background_addresses.discard(key)
+
+
+def schedule_geocoding(addresses):
+    """
+    Ставит адреса в очередь фонового геокодирования.
+    Адрес, который уже стоит в очереди, повторно не добавляется.
+    При GEOCODER_BACKGROUND_WORKERS = 0 фоновое геокодирование выключено,
+    и адреса заполняются командой update_coordinates.
+    """
+    if not settings.GEOCODER_BACKGROUND_WORKERS:
+        return
+
+    executor = _get_background_executor()
+    for address in addresses:
+        key = normalize_address(address)
+        with _background_lock:
+            if key in _background_addresses:
+                continue
+            _background_addresses.add(key)
+        executor.submit(_geocode_in_background, address, key)
+
+
+@timing("geocoder")
+def get_cached_coordinates(addresses):
+    """
+    Возвращает координаты адресов только из кэша координат, снимка
+    координат и таблицы Place, не обращаясь к API.
+
+    Результат - пара (coordinates, pending): coordinates - словарь
+    {адрес: (широта, долгота) или None, если адрес не найден},
+    pending - множество адресов, которых ещё нет в Place. Они, как и адреса
+    с устаревшими координатами, отправляются на фоновое геокодирование,
+    поэтому функцию можно вызывать из HTTP-запроса.
+    """
+    addresses_by_key = {}
+    for address in addresses:
+        if address and address.strip():
+            addresses_by_key.setdefault(normalize_address(address), []).append(address)
+
+    coordinates = {}
+    cached = get_coordinates_cache().get_many(list(addresses_by_key))
+    for key, coords in cached.items():
+        for address in addresses_by_key.pop(key):
+            coordinates[address] = coords
+
+    entries, changed_since = _find_in_snapshot(list(addresses_by_key))
+    places_filter = Q(
+        normalized_address__in=[key for key in addresses_by_key if key not in entries]
+    )
+    if changed_since:
+        places_filter |= Q(normalized_address__in=entries, updated_at__gt=changed_since)
+    db_places = {
+        place.normalized_address: place
+        for place in Place.objects.filter(places_filter).only(
+            "normalized_address", "lat", "lon", "updated_at"
+        )
+    }
+    # Записи Place, изменённые после выгрузки снимка, заменяют записи снимка
+    places = {**entries, **db_places}
+
+    stale_addresses = []
+    fresh_places = []
+    for key, place in places.items():
+        key_addresses = addresses_by_key.pop(key)
+        for address in key_addresses:
+            coordinates[address] = _get_place_coordinates(place)
+        if not _is_fresh(place):
+            stale_addresses.append(key_addresses[0])
+        elif key in db_places:
+            fresh_places.append(place)
+
+    _cache_places(fresh_places)
+    schedule_geocoding(stale_addresses)
+    schedule_geocoding(key_addresses[0] for key_addresses in addresses_by_key.values())
+    pending = {
+        address
+        for key_addresses in addresses_by_key.values()
+        for address in key_addresses
+    }
+
+    return coordinates, pending
@@ -0,0 +1,112 @@
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from places.backends import GeocoderClient, fetch_coordinates
+
+STUB_RESPONSE = json.dumps(
+    {
+        "response": {
+            "GeoObjectCollection": {
+                "featureMember": [
+                    {"GeoObject": {"Point": {"pos": "37.617698 55.755864"}}}
+                ]
+            }
+        }
+    }
+).encode("utf-8")
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    """Отвечает как API Яндекса и поддерживает keep-alive (HTTP/1.1)."""
+
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят разными пакетами, без TCP_NODELAY keep-alive
+    # соединение упирается в задержку подтверждения ~40 мс
+    disable_nagle_algorithm = True
+    latency = 0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает задержку геокодирования без пула соединений и через "
+        "GeocoderClient на локальном stub-сервере"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookups", type=int, default=500, help="Количество запросов"
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="Искусственная задержка ответа stub-сервера, мс",
+        )
+
+    def handle(self, *args, **options):
+        StubGeocoderHandler.latency = options["latency"] / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeocoderHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/1.x"
+
+        addresses = [
+            f"Москва, ул. Тестовая, {number}" for number in range(options["lookups"])
+        ]
+        client = GeocoderClient("stub-key", base_url=base_url)
+        try:
+            bare_timings = self.measure(
+                addresses,
+                lambda address: fetch_coordinates(
+                    "stub-key", address, base_url=base_url
+                ),
+            )
+            pooled_timings = self.measure(addresses, client.fetch_coordinates)
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(f"Запросов: {len(addresses)}, stub-сервер: {base_url}")
+        self.stdout.write(f"{'':>22} {'среднее':>9} {'p50':>8} {'p95':>8}")
+        self.report("requests.get", bare_timings)
+        self.report("GeocoderClient (пул)", pooled_timings)
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Ускорение на запрос: "
+                f"{statistics.mean(bare_timings) / statistics.mean(pooled_timings):.1f}x"
+            )
+        )
+
+    @staticmethod
+    def measure(addresses, fetch):
+        timings = []
+        for address in addresses:
+            started_at = time.perf_counter()
+            fetch(address)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        return timings
+
+    def report(self, title, timings):
+        quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+        self.stdout.write(
+            f"{title:>22} {statistics.mean(timings):>7.2f}мс "
+            f"{quantiles[49]:>6.2f}мс {quantiles[94]:>6.2f}мс"
+        )
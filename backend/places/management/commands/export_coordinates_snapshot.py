@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from places.models import Place
+from places.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает координаты всех мест в двоичный снимок, который воркеры "
+        "читают через mmap без запросов к БД. Места, изменённые после выгрузки, "
+        "по-прежнему берутся из БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.GEOCODER_SNAPSHOT_PATH,
+            help="Файл снимка (по умолчанию GEOCODER_SNAPSHOT_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        if not path:
+            raise CommandError("Не задан файл снимка: укажите --output")
+
+        started_at = time.monotonic()
+        # Время берётся до чтения, чтобы записи, изменённые во время
+        # выгрузки, считались новее снимка
+        created_at = timezone.now()
+        rows = Place.objects.values_list(
+            "normalized_address", "lat", "lon", "updated_at"
+        ).iterator(chunk_size=5000)
+        count = write_snapshot(path, rows, created_at)
+
+        elapsed = time.monotonic() - started_at
+        size_kb = os.path.getsize(path) / 1024
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Снимок {path}: {count} мест, {size_kb:.1f} КБ, время {elapsed:.1f} с"
+            )
+        )
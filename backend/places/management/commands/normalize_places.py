@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from foodcartapp.models import Order, Restaurant
+from places.models import Place
+from places.normalization import normalize_address, renormalize_places
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает нормализованные адреса мест, объединяет дубликаты "
+        "и показывает, сколько адресов заказов и ресторанов находится в кэше "
+        "по точному и по нормализованному совпадению"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать отчёт, не изменяя БД",
+        )
+
+    def handle(self, *args, **options):
+        addresses = set(
+            Order.objects.values_list("address", flat=True).distinct()
+        ) | set(Restaurant.objects.values_list("address", flat=True).distinct())
+        addresses = {address for address in addresses if address and address.strip()}
+
+        place_addresses = list(Place.objects.values_list("address", flat=True))
+        exact_keys = set(place_addresses)
+        normalized_keys = {normalize_address(address) for address in place_addresses}
+
+        exact_hits = len(addresses & exact_keys)
+        normalized_hits = sum(
+            normalize_address(address) in normalized_keys for address in addresses
+        )
+        total = len(addresses) or 1
+
+        self.stdout.write(f"Уникальных адресов заказов и ресторанов: {len(addresses)}")
+        self.stdout.write(
+            f"Найдено в кэше по точному совпадению: {exact_hits} "
+            f"({exact_hits / total:.1%})"
+        )
+        self.stdout.write(
+            f"Найдено в кэше после нормализации: {normalized_hits} "
+            f"({normalized_hits / total:.1%})"
+        )
+        self.stdout.write(
+            f"Записей Place: {len(place_addresses)}, "
+            f"уникальных ключей: {len(normalized_keys)}"
+        )
+
+        if options["dry_run"]:
+            return
+
+        with transaction.atomic():
+            deleted = renormalize_places(Place)
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово! Удалено дубликатов: {deleted}")
+        )
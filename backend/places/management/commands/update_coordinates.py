@@ -1,39 +1,169 @@
-from django.core.management.base import BaseCommand
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from places.models import Place
-from places.geocoder import get_or_create_coordinates
+from places.geocoder import (
+    GEOCODE_SKIPPED,
+    geocode_many,
+    get_circuit_breaker,
+    set_rate_limit,
+)
 
 
 class Command(BaseCommand):
-    help = "Обновляет устаревшие координаты в БД"
+    help = (
+        "Обновляет устаревшие координаты в БД. Адреса обрабатываются пачками "
+        "в порядке id, после каждой пачки сохраняется контрольная точка, "
+        "поэтому прерванное обновление можно продолжить с --resume"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--days",
             type=int,
-            default=30,
-            help="Обновлять координаты старше N дней (по умолчанию 30)",
+            default=settings.GEOCODER_CACHE_DAYS,
+            help="Обновлять координаты старше N дней (по умолчанию GEOCODER_CACHE_DAYS)",
         )
         parser.add_argument(
             "--all", action="store_true", help="Обновить все координаты"
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Количество параллельных запросов к геокодеру",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Не больше N запросов к геокодеру в секунду "
+            "(по умолчанию GEOCODER_RATE_LIMIT)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Адресов в одной пачке (по умолчанию 500)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.BASE_DIR, ".update_coordinates.json"),
+            help="Файл контрольной точки",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с контрольной точки прерванного запуска",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать адреса, не обращаясь к геокодеру",
+        )
 
     def handle(self, *args, **options):
-        days = options["days"]
-        update_all = options["all"]
+        checkpoint_path = options["checkpoint"]
+        checkpoint = self.load_checkpoint(checkpoint_path) if options["resume"] else None
 
-        if update_all:
-            places = Place.objects.all()
+        if checkpoint:
+            update_all = checkpoint["all"]
+            cutoff_date = datetime.fromisoformat(checkpoint["cutoff_date"])
+            last_pk = checkpoint["last_pk"]
+            self.stdout.write(f"Продолжение с места id > {last_pk}")
         else:
-            cutoff_date = timezone.now() - timezone.timedelta(days=days)
-            places = Place.objects.filter(updated_at__lt=cutoff_date)
+            update_all = options["all"]
+            cutoff_date = timezone.now() - timezone.timedelta(days=options["days"])
+            last_pk = 0
+
+        places = Place.objects.filter(pk__gt=last_pk)
+        if not update_all:
+            places = places.filter(updated_at__lt=cutoff_date)
+        places = places.order_by("pk").values_list("pk", "address")
 
         self.stdout.write(f"Найдено {places.count()} мест для обновления")
+        if options["dry_run"]:
+            return
+
+        if options["rate"] is not None:
+            set_rate_limit(options["rate"])
+
+        processed = found = 0
+        started_at = time.monotonic()
+        rows = places.iterator(chunk_size=options["chunk_size"])
+        while chunk := list(islice(rows, options["chunk_size"])):
+            statuses = {}
+            results = geocode_many(
+                [address for _, address in chunk],
+                refresh=True,
+                workers=options["workers"],
+                statuses=statuses,
+            )
+            # Пока автомат разомкнут, API не вызывается: адреса с первого
+            # пропущенного не обновлены, и контрольная точка встаёт перед ним
+            skipped_at = next(
+                (
+                    position
+                    for position, (_, address) in enumerate(chunk)
+                    if statuses.get(address) == GEOCODE_SKIPPED
+                ),
+                None,
+            )
+            done = chunk[:skipped_at]
+            processed += len(done)
+            found += sum(1 for _, address in done if results.get(address))
+            if done:
+                last_pk = done[-1][0]
+
+            self.save_checkpoint(
+                checkpoint_path,
+                {
+                    "all": update_all,
+                    "cutoff_date": cutoff_date.isoformat(),
+                    "last_pk": last_pk,
+                },
+            )
+            if skipped_at is not None:
+                retry_in = get_circuit_breaker().get_state()["retry_in"]
+                raise CommandError(
+                    f"Автомат геокодера разомкнут, обработано {processed} адресов. "
+                    f"Продолжите с --resume через {retry_in or 0:.0f} с"
+                )
+
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                f"Обработано {processed} адресов, {processed / elapsed:.1f} адр/с"
+            )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started_at
+        throughput = processed / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обновлено {processed} записей, координаты найдены для {found}, "
+                f"время {elapsed:.1f} с, {throughput:.1f} адр/с"
+            )
+        )
 
-        updated = 0
-        for place in places:
-            self.stdout.write(f"Обновление: {place.address}")
-            get_or_create_coordinates(place.address)
-            updated += 1
+    def load_checkpoint(self, path):
+        try:
+            with open(path, encoding="utf-8") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            self.stdout.write("Контрольная точка не найдена, обновление с начала")
+            return None
 
-        self.stdout.write(self.style.SUCCESS(f"Обновлено {updated} записей"))
+    @staticmethod
+    def save_checkpoint(path, checkpoint):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, path)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='normalized_address',
+            field=models.CharField(max_length=200, null=True, verbose_name='Нормализованный адрес'),
+        ),
+    ]
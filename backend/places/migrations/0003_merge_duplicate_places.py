@@ -0,0 +1,95 @@
+import re
+
+from django.db import migrations
+
+# Копия places.normalization на момент миграции: миграция должна давать
+# тот же результат, даже если правила нормализации потом изменятся
+
+# Полные и сокращённые формы приводятся к одному сокращению
+ABBREVIATIONS = {
+    "улица": "ул",
+    "проспект": "пр-кт",
+    "просп": "пр-кт",
+    "пр-т": "пр-кт",
+    "переулок": "пер",
+    "площадь": "пл",
+    "шоссе": "ш",
+    "бульвар": "б-р",
+    "бул": "б-р",
+    "набережная": "наб",
+    "проезд": "пр-д",
+    "тупик": "туп",
+    "микрорайон": "мкр",
+    "корпус": "к",
+    "корп": "к",
+    "строение": "стр",
+    "квартира": "кв",
+    "подъезд": "под",
+    "область": "обл",
+    "район": "р-н",
+    "город": "г",
+    "дом": "д",
+}
+
+# Слова, которые не меняют смысл адреса: "г. Москва" и "Москва",
+# "д. 1" и "1", страна и почтовый индекс
+SKIPPED_TOKENS = {"г", "д", "россия", "рф"}
+POSTCODE_PATTERN = re.compile(r"^\d{6}$")
+
+TOKEN_PATTERN = re.compile(r"[\w/]+(?:-[\w/]+)*")
+# "д1", "к2", "стр3" - сокращение, слитное с номером
+NUMBERED_ABBREVIATION_PATTERN = re.compile(r"^(д|к|корп|стр|кв)(\d[\w/]*)$")
+
+
+def normalize_address(address):
+    text = address.lower().replace("ё", "е")
+
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        match = NUMBERED_ABBREVIATION_PATTERN.match(token)
+        parts = match.groups() if match else (token,)
+        for part in parts:
+            part = ABBREVIATIONS.get(part, part)
+            if part in SKIPPED_TOKENS or POSTCODE_PATTERN.match(part):
+                continue
+            tokens.append(part)
+
+    return " ".join(tokens) or text.strip()
+
+
+def merge_duplicate_places(apps, schema_editor):
+    Place = apps.get_model('places', 'Place')
+
+    places_by_key = {}
+    for place in Place.objects.order_by("pk"):
+        places_by_key.setdefault(normalize_address(place.address), []).append(place)
+
+    # Из дубликатов остаётся запись с координатами и самая свежая
+    duplicate_ids = []
+    places_to_update = []
+    for key, places in places_by_key.items():
+        places.sort(
+            key=lambda place: (place.lat is not None, place.updated_at),
+            reverse=True,
+        )
+        kept_place, *duplicates = places
+        duplicate_ids.extend(place.pk for place in duplicates)
+        if kept_place.normalized_address != key:
+            kept_place.normalized_address = key
+            places_to_update.append(kept_place)
+
+    Place.objects.filter(pk__in=duplicate_ids).delete()
+    Place.objects.bulk_update(
+        places_to_update, ["normalized_address"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0002_place_normalized_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0003_merge_duplicate_places'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='normalized_address',
+            field=models.CharField(max_length=200, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+    ]
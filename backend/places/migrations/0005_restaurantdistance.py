@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0011_delete_place'),
+        ('places', '0004_alter_place_normalized_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(blank=True, null=True, verbose_name='Расстояние, км')),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='restaurant_distances', to='places.place', verbose_name='Место')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distances', to='foodcartapp.restaurant', verbose_name='Ресторан')),
+            ],
+            options={
+                'verbose_name': 'Расстояние до ресторана',
+                'verbose_name_plural': 'Расстояния до ресторанов',
+                'unique_together': {('place', 'restaurant')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0005_restaurantdistance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='address',
+            field=models.CharField(max_length=200, unique=True, verbose_name='Адрес'),
+        ),
+        migrations.AlterField(
+            model_name='place',
+            name='lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='place',
+            name='lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+        migrations.AlterField(
+            model_name='place',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления'),
+        ),
+    ]
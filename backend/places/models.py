@@ -1,10 +1,17 @@
 from django.db import models
 
+from .normalization import normalize_address
+
 
 class Place(models.Model):
-    address = models.CharField("Адрес", max_length=200, unique=True, db_index=True)
-    lat = models.FloatField("Широта", null=True, blank=True, db_index=True)
-    lon = models.FloatField("Долгота", null=True, blank=True, db_index=True)
+    address = models.CharField("Адрес", max_length=200, unique=True)
+    normalized_address = models.CharField(
+        "Нормализованный адрес", max_length=200, unique=True
+    )
+    lat = models.FloatField("Широта", null=True, blank=True)
+    lon = models.FloatField("Долгота", null=True, blank=True)
+    # Индекс нужен update_coordinates (поиск устаревших мест) и расчёту
+    # времени последнего изменения Place для снимка координат
     updated_at = models.DateTimeField("Дата обновления", auto_now=True, db_index=True)
 
     class Meta:
@@ -12,9 +19,63 @@ class Place(models.Model):
         verbose_name_plural = "Места"
         ordering = ["address"]
 
+    # Поля, от которых зависят сохранённые расстояния RestaurantDistance
+    LOCATION_FIELDS = ["normalized_address", "lat", "lon"]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        place = super().from_db(db, field_names, values)
+        place.remember_location()
+        return place
+
+    def remember_location(self):
+        """Запоминает адрес и координаты, с которыми запись лежит в БД."""
+        loaded_fields = self.__dict__
+        if all(field in loaded_fields for field in self.LOCATION_FIELDS):
+            self._saved_location = tuple(
+                loaded_fields[field] for field in self.LOCATION_FIELDS
+            )
+        else:
+            self._saved_location = None
+
+    def has_location_changed(self):
+        """Изменились ли адрес или координаты с загрузки из БД."""
+        saved_location = getattr(self, "_saved_location", None)
+        return saved_location != tuple(
+            getattr(self, field) for field in self.LOCATION_FIELDS
+        )
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return (
             f"{self.address}: {self.lat}, {self.lon}"
             if self.lat and self.lon
             else self.address
         )
+
+
+class RestaurantDistance(models.Model):
+    restaurant = models.ForeignKey(
+        "foodcartapp.Restaurant",
+        verbose_name="Ресторан",
+        related_name="distances",
+        on_delete=models.CASCADE,
+    )
+    place = models.ForeignKey(
+        Place,
+        verbose_name="Место",
+        related_name="restaurant_distances",
+        on_delete=models.CASCADE,
+    )
+    distance = models.FloatField("Расстояние, км", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Расстояние до ресторана"
+        verbose_name_plural = "Расстояния до ресторанов"
+        unique_together = [["place", "restaurant"]]
+
+    def __str__(self):
+        return f"{self.restaurant} - {self.place.address}: {self.distance} км"
@@ -0,0 +1,50 @@
+from functools import partial
+
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .distances import invalidate_distances, invalidate_place_distances
+from .geocoder import (
+    coordinates_changed,
+    invalidate_coordinates,
+    reset_geocoder_backend,
+)
+from .models import Place
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidate_coordinates_on_change(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_coordinates, instance.normalized_address))
+
+
+@receiver(post_save, sender=Place)
+def invalidate_distances_on_change(sender, instance, raw=False, **kwargs):
+    # Правка без смены адреса и координат расстояний не меняет
+    if raw or not instance.has_location_changed():
+        return
+    instance.remember_location()
+    transaction.on_commit(
+        partial(invalidate_place_distances, instance.id, instance.normalized_address)
+    )
+
+
+@receiver(post_delete, sender=Place)
+def invalidate_distances_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(invalidate_place_distances, None, instance.normalized_address)
+    )
+
+
+@receiver(coordinates_changed)
+def invalidate_distances_on_bulk_change(sender, keys, **kwargs):
+    transaction.on_commit(partial(invalidate_distances, keys))
+
+
+@receiver(setting_changed)
+def reset_geocoder_backend_on_settings_change(setting, **kwargs):
+    # override_settings в тестах и бенчмарках подменяет бэкенд геокодера
+    if setting in ("GEOCODER_BACKEND", "GEOCODER_BACKEND_OPTIONS"):
+        reset_geocoder_backend()
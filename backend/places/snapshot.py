@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SBPLACES"
+SNAPSHOT_VERSION = 1
+# magic, версия, порядок байт (0 - little, 1 - big), число записей, время выгрузки
+SNAPSHOT_HEADER = struct.Struct("=8sHHId")
+SNAPSHOT_HEADER_SIZE = 32
+# float32 хранит координаты с точностью около метра, лишние знаки отбрасываются
+SNAPSHOT_PRECISION = 5
+
+# Как часто проверять, не заменили ли файл снимка новым, секунды
+SNAPSHOT_CHECK_INTERVAL = 1
+
+# Запись снимка повторяет поля Place, которые нужны геокодеру
+SnapshotEntry = namedtuple(
+    "SnapshotEntry", ["normalized_address", "lat", "lon", "updated_at"]
+)
+
+
+def get_address_hash(key):
+    """64-битный хэш нормализованного адреса, по нему ищутся записи снимка."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def write_snapshot(path, rows, created_at):
+    """
+    Записывает снимок координат. rows - итерируемое
+    (normalized_address, lat, lon, updated_at), created_at - время, на которое
+    снимок актуален. Адрес без координат сохраняется с NaN (отрицательный кэш).
+
+    Файл состоит из заголовка и четырёх столбцов: отсортированные хэши
+    адресов (uint64), широты и долготы (float32) и время обновления (uint32,
+    секунды Unix). Файл пишется рядом и подменяется через os.replace,
+    поэтому воркеры, уже открывшие старый снимок, продолжают его читать.
+    Возвращает число записей.
+    """
+    entries = {}
+    for key, lat, lon, updated_at in rows:
+        entries[get_address_hash(key)] = (
+            float("nan") if lat is None else lat,
+            float("nan") if lon is None else lon,
+            int(updated_at.timestamp()),
+        )
+
+    hashes = array("Q", sorted(entries))
+    lats = array("f", (entries[address_hash][0] for address_hash in hashes))
+    lons = array("f", (entries[address_hash][1] for address_hash in hashes))
+    updated = array("I", (entries[address_hash][2] for address_hash in hashes))
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        sys.byteorder == "big",
+        len(hashes),
+        created_at.timestamp(),
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as snapshot_file:
+        snapshot_file.write(header.ljust(SNAPSHOT_HEADER_SIZE, b"\0"))
+        for column in (hashes, lats, lons, updated):
+            column.tofile(snapshot_file)
+    os.replace(tmp_path, path)
+    return len(hashes)
+
+
+class CoordinatesSnapshot:
+    """
+    Снимок координат, открытый через mmap.
+
+    Страницы файла общие для всех процессов, которые его открыли, а поиск
+    идёт бинарным поиском прямо по отображённой памяти без копирования
+    и без обращения к БД.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self.stat = os.fstat(snapshot_file.fileno())
+            self.mmap = mmap.mmap(
+                snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        magic, version, is_big_endian, count, created_at = (
+            SNAPSHOT_HEADER.unpack_from(self.mmap)
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.mmap.close()
+            raise ValueError(f"{path} не является снимком координат")
+        if is_big_endian != (sys.byteorder == "big"):
+            self.mmap.close()
+            raise ValueError(f"Снимок {path} записан с другим порядком байт")
+
+        self.count = count
+        self.created_at = datetime.fromtimestamp(created_at, tz=timezone.utc)
+
+        view = memoryview(self.mmap)
+        offset = SNAPSHOT_HEADER_SIZE
+        self.hashes = view[offset:offset + 8 * count].cast("Q")
+        offset += 8 * count
+        self.lats = view[offset:offset + 4 * count].cast("f")
+        offset += 4 * count
+        self.lons = view[offset:offset + 4 * count].cast("f")
+        offset += 4 * count
+        self.updated = view[offset:offset + 4 * count].cast("I")
+
+    def get(self, key):
+        """Возвращает SnapshotEntry или None, если адреса нет в снимке."""
+        address_hash = get_address_hash(key)
+        position = bisect_left(self.hashes, address_hash)
+        if position == self.count or self.hashes[position] != address_hash:
+            return None
+
+        lat = self.lats[position]
+        lon = self.lons[position]
+        updated_at = self.updated[position]
+        return SnapshotEntry(
+            normalized_address=key,
+            lat=None if math.isnan(lat) else round(lat, SNAPSHOT_PRECISION),
+            lon=None if math.isnan(lon) else round(lon, SNAPSHOT_PRECISION),
+            updated_at=datetime.fromtimestamp(updated_at, tz=timezone.utc),
+        )
+
+    def is_replaced(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns) != (
+            self.stat.st_ino,
+            self.stat.st_mtime_ns,
+        )
+
+    def get_state(self):
+        return {
+            "path": self.path,
+            "entries": self.count,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+def get_changes_marker_path(path):
+    """Файл-метка рядом со снимком, его mtime - время изменения Place."""
+    return f"{path}.changed"
+
+
+def mark_snapshot_outdated(path):
+    """
+    Отмечает, что Place изменились после выгрузки снимка path. Метка -
+    время изменения файла, поэтому её видят все процессы на сервере,
+    независимо от бэкенда кэша Django.
+    """
+    marker_path = get_changes_marker_path(path)
+    try:
+        with open(marker_path, "a"):
+            pass
+        os.utime(marker_path)
+    except OSError as e:
+        logger.warning(f"Не удалось обновить метку снимка {marker_path}: {e}")
+
+
+class SnapshotLoader:
+    """
+    Открывает снимок при первом обращении и переоткрывает его, если файл
+    заменили новым. Отсутствующий или повреждённый файл означает работу
+    без снимка.
+
+    Вместе с файлом снимка проверяется метка mark_snapshot_outdated:
+    changed_at - время последнего изменения Place по ней, секунды Unix.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = None
+        self.checked_at = None
+        self.changed_at = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not self.path:
+            return None
+
+        now = time.monotonic()
+        checked_at = self.checked_at
+        if checked_at is not None and now - checked_at < SNAPSHOT_CHECK_INTERVAL:
+            return self.snapshot
+
+        with self.lock:
+            self.checked_at = now
+            if self.snapshot is None or self.snapshot.is_replaced():
+                self.snapshot = self.open()
+            self.changed_at = self.get_marker_time()
+            return self.snapshot
+
+    def get_marker_time(self):
+        try:
+            return os.stat(get_changes_marker_path(self.path)).st_mtime
+        except OSError:
+            return 0
+
+    def open(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            return CoordinatesSnapshot(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Не удалось открыть снимок координат {self.path}: {e}")
+            return None
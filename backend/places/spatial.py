@@ -0,0 +1,145 @@
+import math
+
+from .geocoder import EARTH_RADIUS_KM, calculate_distances
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Размер ячейки сетки по умолчанию, км
+GRID_CELL_KM = 2
+# Выше этой широты ячейки слишком сужаются по долготе
+GRID_MAX_LATITUDE = 85
+
+
+class GridIndex:
+    """
+    Пространственный индекс точек на равномерной сетке.
+
+    Точки раскладываются по ячейкам со стороной не меньше cell_km. Поиск
+    ближайших идёт кольцами ячеек от ячейки запроса и останавливается,
+    как только ближайшая из непросмотренных ячеек заведомо дальше k-й
+    найденной точки, поэтому время поиска зависит от плотности точек
+    рядом с запросом, а не от их общего числа.
+    """
+
+    def __init__(self, points, cell_km=GRID_CELL_KM):
+        """
+        points - пары (значение, (широта, долгота)),
+        точки без координат пропускаются.
+        """
+        points = [(value, coords) for value, coords in points if coords]
+
+        self.cell_km = cell_km
+        self.lat_step = cell_km / KM_PER_DEGREE
+        # Шаг по долготе подобран по самой северной (южной) точке, чтобы
+        # ячейка нигде между точками не была уже cell_km
+        self.max_latitude = min(
+            max((abs(lat) for _, (lat, _) in points), default=0), GRID_MAX_LATITUDE
+        )
+        self.lon_step = self.lat_step / math.cos(math.radians(self.max_latitude))
+
+        self.cells = {}
+        for value, coords in points:
+            self.cells.setdefault(self.get_cell(coords), []).append((value, coords))
+
+        rows = [row for row, _ in self.cells]
+        columns = [column for _, column in self.cells]
+        self.bounds = (
+            (min(rows), max(rows), min(columns), max(columns)) if self.cells else None
+        )
+
+    def __len__(self):
+        return sum(len(cell_points) for cell_points in self.cells.values())
+
+    def get_cell(self, coords):
+        lat, lon = coords
+        return (math.floor(lat / self.lat_step), math.floor(lon / self.lon_step))
+
+    def get_ring(self, center, radius):
+        """Ячейки на расстоянии radius ячеек от center (по Чебышёву)."""
+        row, column = center
+        if radius == 0:
+            return [center] if center in self.cells else []
+
+        ring = []
+        for offset in range(-radius, radius + 1):
+            ring.append((row - radius, column + offset))
+            ring.append((row + radius, column + offset))
+        for offset in range(-radius + 1, radius):
+            ring.append((row + offset, column - radius))
+            ring.append((row + offset, column + radius))
+        return [cell for cell in ring if cell in self.cells]
+
+    def get_cells_beyond(self, center, radius):
+        """Занятые ячейки на расстоянии radius ячеек от center и дальше."""
+        row, column = center
+        return [
+            cell
+            for cell in self.cells
+            if max(abs(cell[0] - row), abs(cell[1] - column)) >= radius
+        ]
+
+    def get_max_radius(self, center):
+        """Радиус кольца, за которым занятых ячеек уже нет."""
+        if self.bounds is None:
+            return -1
+
+        row, column = center
+        min_row, max_row, min_column, max_column = self.bounds
+        return max(
+            abs(row - min_row),
+            abs(row - max_row),
+            abs(column - min_column),
+            abs(column - max_column),
+        )
+
+    def get_min_cell_km(self, origin):
+        """
+        Наименьшая ширина ячейки в км между origin и точками. Для запроса
+        севернее (южнее) всех точек ячейки у него уже cell_km по долготе.
+        """
+        latitude = min(max(abs(origin[0]), self.max_latitude), GRID_MAX_LATITUDE)
+        lon_km = self.lon_step * KM_PER_DEGREE * math.cos(math.radians(latitude))
+        return min(self.cell_km, lon_km)
+
+    def nearest(self, origin, limit, accept=None):
+        """
+        Возвращает до limit ближайших к origin точек в виде списка пар
+        (значение, расстояние в км), отсортированного по расстоянию.
+        accept(значение) отбирает подходящие точки.
+        """
+        center = self.get_cell(origin)
+        cell_km = self.get_min_cell_km(origin)
+        found = []
+        for radius in range(self.get_max_radius(center) + 1):
+            # Любая точка кольца radius не ближе (radius - 1) ячеек
+            if len(found) >= limit and found[-1][1] <= (radius - 1) * cell_km:
+                break
+
+            # Дальние кольца почти пусты: дешевле один раз перебрать все
+            # оставшиеся занятые ячейки, чем обходить ячейки колец по одной
+            is_last = 8 * radius > len(self.cells)
+            if is_last:
+                cells = self.get_cells_beyond(center, radius)
+            else:
+                cells = self.get_ring(center, radius)
+
+            candidates = [
+                (value, coords)
+                for cell in cells
+                for value, coords in self.cells[cell]
+                if accept is None or accept(value)
+            ]
+            if candidates:
+                [distances] = calculate_distances(
+                    [origin], [coords for _, coords in candidates]
+                )
+                found.extend(
+                    (value, distance)
+                    for (value, _), distance in zip(candidates, distances)
+                )
+                found.sort(key=lambda item: item[1])
+                del found[limit:]
+
+            if is_last:
+                break
+
+        return found
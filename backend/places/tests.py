@@ -0,0 +1,531 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from foodcartapp.models import Restaurant
+
+from .backends import YandexGeocoderBackend
+from .distances import (
+    get_restaurant_distances,
+    invalidate_distances,
+    invalidate_place_distances,
+)
+from .geocoder import (
+    PLACES_CHANGED_AT_KEY,
+    CircuitBreaker,
+    GeocoderUnavailable,
+    _fetch_and_store_with_lock,
+    _get_lock_key,
+    _has_recent_failure,
+    calculate_distances,
+    geocode_many,
+    geocoding_budget,
+    get_coordinates_cache,
+    get_or_create_coordinates,
+    mark_places_changed,
+    refresh_coordinates,
+    request_coordinates,
+)
+from .models import Place, RestaurantDistance
+from .normalization import normalize_address
+from .snapshot import SnapshotLoader, mark_snapshot_outdated, write_snapshot
+from .spatial import GridIndex
+
+
+def brute_force_nearest(points, origin, limit, accept=None):
+    points = [
+        (value, coords)
+        for value, coords in points
+        if coords and (accept is None or accept(value))
+    ]
+    if not points:
+        return []
+    [distances] = calculate_distances([origin], [coords for _, coords in points])
+    found = sorted(
+        zip((value for value, _ in points), distances), key=lambda item: item[1]
+    )
+    return found[:limit]
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def assert_same_key(self, *addresses):
+        keys = {normalize_address(address) for address in addresses}
+        self.assertEqual(len(keys), 1, keys)
+
+    def test_case_and_yo(self):
+        self.assert_same_key("МОСКВА, Тверская, 1", "москва, тверская, 1")
+        self.assert_same_key("Москва, ул. Королёва, 5", "москва, ул. королева, 5")
+
+    def test_whitespace(self):
+        self.assert_same_key(
+            "Москва, Тверская, 1", "  Москва,   Тверская,\t1  ", "Москва,Тверская,1"
+        )
+
+    def test_punctuation(self):
+        self.assert_same_key(
+            "Москва, ул. Ленина, д. 1",
+            "Москва ул Ленина д 1",
+            "Москва; ул.Ленина; д.1!",
+        )
+        self.assertEqual(normalize_address("Москва, Ленина, 1/2"), "москва ленина 1/2")
+        self.assertEqual(
+            normalize_address("Москва, Северный б-р, 7"), "москва северный б-р 7"
+        )
+
+    def test_abbreviations(self):
+        self.assert_same_key(
+            "Москва, улица Ленина, дом 1, корпус 2, строение 3",
+            "Москва, ул. Ленина, д. 1, корп. 2, стр. 3",
+            "г. Москва, ул Ленина, д1, к2, стр3",
+        )
+        self.assert_same_key(
+            "Москва, Ленинский проспект, 1",
+            "Москва, Ленинский просп., 1",
+            "Москва, Ленинский пр-т, 1",
+        )
+
+    def test_country_and_postcode_skipped(self):
+        self.assert_same_key(
+            "Россия, 125009, г. Москва, ул. Тверская, 1", "Москва, ул. Тверская, 1"
+        )
+
+    def test_different_addresses_differ(self):
+        self.assertNotEqual(
+            normalize_address("Москва, Тверская, 1"),
+            normalize_address("Москва, Тверская, 11"),
+        )
+        self.assertNotEqual(
+            normalize_address("Москва, Тверская, 1, к2"),
+            normalize_address("Москва, Тверская, 1, кв 2"),
+        )
+
+    def test_address_without_words(self):
+        self.assertEqual(normalize_address(" ,.; "), ",.;")
+
+
+class GridIndexTest(SimpleTestCase):
+    def test_empty_index(self):
+        for points in ([], [("без координат", None)]):
+            with self.subTest(points=points):
+                index = GridIndex(points)
+                self.assertEqual(len(index), 0)
+                self.assertIsNone(index.bounds)
+                self.assertEqual(index.nearest((55.75, 37.6), 5), [])
+
+    def test_points_without_coordinates_skipped(self):
+        index = GridIndex([("a", (55.75, 37.6)), ("b", None)])
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual([value for value, _ in index.nearest((55.7, 37.6), 5)], ["a"])
+
+    def test_cell_boundaries(self):
+        index = GridIndex([("origin", (55.75, 37.6))])
+        boundary = (index.get_cell((55.75, 37.6))[0] + 1) * index.lat_step
+        below = (boundary - 1e-6, 37.6)
+        above = (boundary + 1e-6, 37.6)
+
+        self.assertEqual(index.get_cell(above)[0], index.get_cell(below)[0] + 1)
+        self.assertEqual(index.get_cell((boundary, 37.6)), index.get_cell(above))
+
+        # Соседняя ячейка за границей ближе, чем дальний угол своей ячейки
+        lower_edge = (boundary - index.lat_step + 1e-6, 37.6)
+        index = GridIndex([("своя ячейка", lower_edge), ("за границей", above)])
+        self.assertEqual(index.nearest(below, 1)[0][0], "за границей")
+
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        points = [
+            (number, (rng.uniform(55.5, 56), rng.uniform(37.3, 37.9)))
+            for number in range(300)
+        ]
+        index = GridIndex(points)
+        for _ in range(20):
+            origin = (rng.uniform(55.4, 56.1), rng.uniform(37.2, 38))
+            for limit in (1, 5, 30):
+                for accept in (None, lambda value: value % 7 == 0):
+                    with self.subTest(origin=origin, limit=limit):
+                        # Расстояния округлены до метра, точки на равном
+                        # расстоянии могут идти в любом порядке
+                        found = index.nearest(origin, limit, accept)
+                        expected = brute_force_nearest(points, origin, limit, accept)
+                        self.assertEqual(
+                            [distance for _, distance in found],
+                            [distance for _, distance in expected],
+                        )
+
+    def test_search_stops_at_cutoff_radius(self):
+        near = ("рядом", (55.7501, 37.6001))
+        # Дальние точки в отдельных ячейках, чтобы поиск шёл по кольцам,
+        # а не перебором всех оставшихся ячеек
+        far = [(f"далеко {number}", (56.5, 36 + number * 0.1)) for number in range(50)]
+        index = GridIndex([near, *far])
+        checked = []
+
+        def accept(value):
+            checked.append(value)
+            return True
+
+        found = index.nearest((55.75, 37.6), 1, accept)
+
+        self.assertEqual([value for value, _ in found], ["рядом"])
+        self.assertEqual(checked, ["рядом"])
+
+    def test_query_north_of_all_points(self):
+        # У запроса на 80° ячейки по долготе втрое уже, чем у точек на 60°:
+        # точка за полюсом в дальнем кольце ближе точки в кольце 9
+        points = [
+            ("на меридиане", (60, 0)),
+            ("южнее", (40, 0)),
+            ("за полюсом", (62, 180)),
+            *(
+                (f"далеко {lat} {column}", (lat, -180 + column * 9))
+                for lat in (-60, -55, -50)
+                for column in range(40)
+            ),
+        ]
+        index = GridIndex(points, cell_km=500)
+        origin = (80, 0)
+
+        found = index.nearest(origin, 2)
+
+        self.assertEqual(
+            [value for value, _ in found], ["на меридиане", "за полюсом"]
+        )
+        self.assertEqual(
+            [distance for _, distance in found],
+            [distance for _, distance in brute_force_nearest(points, origin, 2)],
+        )
+
+    def test_limit_larger_than_points(self):
+        index = GridIndex([("a", (55.75, 37.6)), ("b", (55.9, 37.4))])
+
+        found = index.nearest((55.75, 37.6), 10)
+
+        self.assertEqual([value for value, _ in found], ["a", "b"])
+        self.assertLess(found[0][1], found[1][1])
+
+
+class FailingAdapter(HTTPAdapter):
+    """Каждый запрос ждёт delay секунд, но не дольше таймаута, и падает."""
+
+    def __init__(self, delay, error=requests.ReadTimeout):
+        super().__init__()
+        self.delay = delay
+        self.error = error
+        self.timeouts = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        time.sleep(min(self.delay, *timeout))
+        raise self.error("Внедрённая ошибка")
+
+
+class GeocoderDeadlineTest(TestCase):
+    def get_client(self, adapter, **options):
+        client = YandexGeocoderBackend("key", backoff_factor=0.05, **options)
+        client.session.mount(client.base_url, adapter)
+        return client
+
+    def assert_finishes_within(self, seconds, func):
+        started_at = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            func()
+        # Запас на паузу опроса и планировщик потоков
+        self.assertLess(time.monotonic() - started_at, seconds + 0.15)
+
+    def test_retries_fit_into_timeout(self):
+        adapter = FailingAdapter(delay=10)
+        client = self.get_client(adapter, retries=2)
+
+        self.assert_finishes_within(
+            0.3, lambda: client.fetch_coordinates("Москва", timeout=0.3)
+        )
+        self.assertTrue(all(max(timeout) <= 0.3 for timeout in adapter.timeouts))
+
+    def test_total_timeout_without_budget(self):
+        client = self.get_client(FailingAdapter(delay=10), total_timeout=0.3)
+
+        self.assert_finishes_within(0.3, lambda: client.fetch_coordinates("Москва"))
+
+    def test_fast_failures_retried(self):
+        adapter = FailingAdapter(delay=0, error=requests.ConnectionError)
+        client = self.get_client(adapter, retries=2)
+
+        with self.assertRaises(requests.ConnectionError):
+            client.fetch_coordinates("Москва")
+        self.assertEqual(len(adapter.timeouts), 3)
+
+    def test_request_coordinates_within_budget(self):
+        client = self.get_client(FailingAdapter(delay=10), retries=2)
+
+        def request():
+            with geocoding_budget(0.3):
+                request_coordinates("Москва")
+
+        with (
+            patch("places.geocoder.get_geocoder_backend", return_value=client),
+            patch(
+                "places.geocoder.get_circuit_breaker",
+                return_value=CircuitBreaker(failure_threshold=5, cooldown=60),
+            ),
+        ):
+            self.assert_finishes_within(0.3, request)
+
+    def test_lock_wait_within_budget(self):
+        # Адрес геокодирует другой процесс и держит блокировку
+        key = normalize_address("Москва")
+        cache.add(_get_lock_key(key), True)
+        self.addCleanup(cache.delete, _get_lock_key(key))
+
+        started_at = time.monotonic()
+        with geocoding_budget(0.3):
+            coords = _fetch_and_store_with_lock("Москва", key, force=False)
+
+        self.assertIsNone(coords)
+        self.assertLess(time.monotonic() - started_at, 0.3 + 0.15)
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class RefreshNotFoundTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.address = "Москва, Тверская, 1"
+        self.key = normalize_address(self.address)
+        get_coordinates_cache().delete(self.key)
+        self.place = Place.objects.create(address=self.address, lat=55.7, lon=37.6)
+
+    def assert_coordinates_kept(self, coords):
+        self.assertEqual(coords, (55.7, 37.6))
+        self.place.refresh_from_db()
+        self.assertEqual((self.place.lat, self.place.lon), (55.7, 37.6))
+        self.assertTrue(_has_recent_failure(self.key))
+
+    def test_refresh_keeps_known_coordinates(self):
+        with patch("places.geocoder.request_coordinates", return_value=None):
+            coords = refresh_coordinates(self.address, force=True)
+
+        self.assert_coordinates_kept(coords)
+
+    def test_bulk_refresh_keeps_known_coordinates(self):
+        with patch("places.geocoder.request_coordinates", return_value=None):
+            coords = geocode_many([self.address], refresh=True)
+
+        self.assert_coordinates_kept(coords[self.address])
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class UpdateCoordinatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.places = [
+            Place.objects.create(address=f"Москва, Тверская, {number}", lat=55, lon=37)
+            for number in range(3)
+        ]
+        Place.objects.update(updated_at=timezone.now() - timedelta(days=365))
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+
+    def update_coordinates(self, *args):
+        call_command(
+            "update_coordinates",
+            "--workers=1",
+            f"--checkpoint={self.checkpoint}",
+            *args,
+            stdout=StringIO(),
+        )
+
+    def test_skipped_addresses_not_counted_as_updated(self):
+        # API ответил на первый адрес, затем автомат разомкнулся
+        def request_coordinates(address):
+            if address != self.places[0].address:
+                raise GeocoderUnavailable("Автомат геокодера разомкнут")
+            return (55.5, 37.5)
+
+        with patch("places.geocoder.request_coordinates", request_coordinates):
+            with self.assertRaises(CommandError):
+                self.update_coordinates()
+
+        with open(self.checkpoint, encoding="utf-8") as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file)["last_pk"], self.places[0].pk)
+        self.assertEqual(
+            list(Place.objects.order_by("pk").values_list("lat", flat=True)),
+            [55.5, 55, 55],
+        )
+
+        with patch("places.geocoder.request_coordinates", return_value=(56, 38)):
+            self.update_coordinates("--resume")
+
+        self.assertEqual(
+            list(Place.objects.order_by("pk").values_list("lat", flat=True)),
+            [55.5, 56, 56],
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class RestaurantDistancesTest(TestCase):
+    def test_missing_distances_calculated_in_one_matrix(self):
+        restaurants = [
+            Restaurant.objects.create(
+                name=f"Ресторан {number}", address=f"Москва, Арбат, {number}"
+            )
+            for number in range(3)
+        ]
+        addresses = [f"Москва, Тверская, {number}" for number in range(4)]
+        for number, restaurant in enumerate(restaurants):
+            Place.objects.create(
+                address=restaurant.address, lat=55.75, lon=37.59 + number / 100
+            )
+        for number, address in enumerate(addresses):
+            Place.objects.create(address=address, lat=55.76 + number / 100, lon=37.6)
+        pairs = [
+            (restaurant, address)
+            for restaurant in restaurants
+            for address in addresses
+        ]
+
+        with patch(
+            "places.distances.calculate_distances", wraps=calculate_distances
+        ) as calculate:
+            distances = get_restaurant_distances(pairs)
+
+        calculate.assert_called_once()
+        for restaurant, address in pairs:
+            [[expected]] = calculate_distances(
+                [(55.76 + addresses.index(address) / 100, 37.6)],
+                [(55.75, 37.59 + restaurants.index(restaurant) / 100)],
+            )
+            self.assertEqual(distances[(restaurant.id, address)], expected)
+        self.assertEqual(RestaurantDistance.objects.count(), len(pairs))
+
+
+class DistanceInvalidationTest(TestCase):
+    def setUp(self):
+        self.restaurant = Restaurant.objects.create(
+            name="Star Burger", address="Москва, Арбат, 1"
+        )
+        self.restaurant_place = Place.objects.create(
+            address="Москва, Арбат, 1", lat=55.75, lon=37.59
+        )
+        self.place = Place.objects.create(
+            address="Москва, Тверская, 1", lat=55.76, lon=37.61
+        )
+        other_restaurant = Restaurant.objects.create(
+            name="Star Burger 2", address="Москва, Ленинский, 1"
+        )
+        RestaurantDistance.objects.bulk_create([
+            RestaurantDistance(restaurant=self.restaurant, place=self.place),
+            RestaurantDistance(restaurant=other_restaurant, place=self.place),
+            RestaurantDistance(
+                restaurant=other_restaurant, place=self.restaurant_place
+            ),
+        ])
+
+    @staticmethod
+    def get_distance_callbacks(callbacks):
+        return [
+            callback
+            for callback in callbacks
+            if callback.func in (invalidate_distances, invalidate_place_distances)
+        ]
+
+    def test_save_without_location_change_skipped(self):
+        place = Place.objects.get(pk=self.place.pk)
+        place.address = "  москва,  тверская, 1 "
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            place.save()
+
+        self.assertEqual(self.get_distance_callbacks(callbacks), [])
+        self.assertEqual(RestaurantDistance.objects.count(), 3)
+
+    def test_coordinates_change_invalidated_after_commit(self):
+        place = Place.objects.get(pk=self.place.pk)
+        place.lat = 55.77
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            place.save()
+            self.assertEqual(RestaurantDistance.objects.count(), 3)
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(RestaurantDistance.objects.filter(place=place).exists())
+        self.assertEqual(RestaurantDistance.objects.count(), 1)
+
+        # Повторное сохранение тех же координат расстояния не трогает
+        with self.captureOnCommitCallbacks() as callbacks:
+            place.save()
+        self.assertEqual(self.get_distance_callbacks(callbacks), [])
+
+    def test_restaurant_place_change_invalidates_restaurant_distances(self):
+        place = Place.objects.get(pk=self.restaurant_place.pk)
+        place.lon = 37.6
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place.save()
+
+        self.assertFalse(
+            RestaurantDistance.objects.filter(restaurant=self.restaurant).exists()
+        )
+        self.assertFalse(RestaurantDistance.objects.filter(place=place).exists())
+        self.assertEqual(RestaurantDistance.objects.count(), 1)
+
+
+class SnapshotLookupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.address = "Москва, Тверская, 1"
+        self.key = normalize_address(self.address)
+        get_coordinates_cache().delete(self.key)
+        Place.objects.create(address=self.address, lat=55.7, lon=37.6)
+        created_at = timezone.now()
+
+        self.path = os.path.join(tempfile.mkdtemp(), "places.snapshot")
+        write_snapshot(self.path, [(self.key, 55.76, 37.61, created_at)], created_at)
+        self.enterContext(override_settings(GEOCODER_SNAPSHOT_PATH=self.path))
+        self.enterContext(
+            patch("places.geocoder._snapshot_loader", SnapshotLoader(self.path))
+        )
+        # Файлы снимка и метки проверяются при каждом обращении
+        self.enterContext(patch("places.snapshot.SNAPSHOT_CHECK_INTERVAL", 0))
+
+    def test_other_place_change_keeps_snapshot(self):
+        Place.objects.create(address="Москва, Арбат, 1", lat=55.75, lon=37.59)
+        mark_places_changed()
+
+        # Проверяется только запись запрошенного адреса
+        with self.assertNumQueries(1):
+            coords = get_or_create_coordinates(self.address)
+
+        self.assertEqual(coords, (55.76, 37.61))
+
+    def test_place_changed_after_snapshot_wins(self):
+        Place.objects.filter(normalized_address=self.key).update(
+            lat=55.8, updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        mark_places_changed()
+
+        self.assertEqual(get_or_create_coordinates(self.address), (55.8, 37.6))
+
+    def test_change_in_other_process_seen_through_marker(self):
+        # Кэш этого процесса не знает об изменении, его видно только по метке
+        cache.set(PLACES_CHANGED_AT_KEY, 0)
+        Place.objects.filter(normalized_address=self.key).update(
+            lat=55.8, updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual(get_or_create_coordinates(self.address), (55.76, 37.61))
+
+        mark_snapshot_outdated(self.path)
+
+        self.assertEqual(get_or_create_coordinates(self.address), (55.8, 37.6))
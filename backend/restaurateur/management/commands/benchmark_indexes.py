@@ -0,0 +1,238 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+from foodcartapp.models import Order, Product, Restaurant, RestaurantMenuItem
+from places.models import Place
+
+from restaurateur.views import _annotate_status_order, _filter_orders
+
+# Одиночные индексы, которые были до миграций foodcartapp.0014 и places.0006.
+# Индекс Place.updated_at вернула places.0007, он есть в обоих замерах
+PREVIOUS_INDEXES = [
+    (Order, "firstname"),
+    (Order, "lastname"),
+    (Order, "status"),
+    (Order, "payment"),
+    (Order, "called_at"),
+    (Order, "delivered_at"),
+    (RestaurantMenuItem, "availability"),
+    (Place, "lat"),
+    (Place, "lon"),
+]
+# Составные и частичные индексы, которые добавили эти миграции
+CURRENT_INDEXES = [
+    (model, index)
+    for model in (Order, RestaurantMenuItem)
+    for index in model._meta.indexes
+]
+
+OPEN_STATUSES = ["pending", "assembly", "delivery"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время запросов доски заказов и каталога и время вставки "
+        "заказов и мест с прежними одиночными индексами и с составными "
+        "и частичными. Данные создаются в транзакции и откатываются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=50000, help="Заказов")
+        parser.add_argument(
+            "--open-share",
+            type=float,
+            default=0.05,
+            help="Доля невыполненных заказов",
+        )
+        parser.add_argument("--places", type=int, default=20000, help="Мест")
+        parser.add_argument(
+            "--restaurants", type=int, default=100, help="Количество ресторанов"
+        )
+        parser.add_argument(
+            "--products", type=int, default=150, help="Количество товаров в меню"
+        )
+        parser.add_argument(
+            "--inserts", type=int, default=500, help="Вставок в замере записи"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Повторов для каждого замера"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Показать планы запросов доски заказов",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.options = options
+
+        # SQLite меняет схему в транзакции только с выключенными проверками
+        # внешних ключей
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            self.seed()
+
+            with connection.schema_editor() as schema_editor:
+                for model, index in CURRENT_INDEXES:
+                    schema_editor.remove_index(model, index)
+                for model, field_name in PREVIOUS_INDEXES:
+                    schema_editor.add_index(model, self.get_previous_index(field_name))
+            before = self.measure_all("Прежние индексы")
+
+            with connection.schema_editor() as schema_editor:
+                for model, field_name in PREVIOUS_INDEXES:
+                    schema_editor.remove_index(
+                        model, self.get_previous_index(field_name)
+                    )
+                for model, index in CURRENT_INDEXES:
+                    schema_editor.add_index(model, index)
+            after = self.measure_all("Новые индексы")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'замер':<34} {'до, мс':>9} {'после, мс':>10} {'ускорение':>10}"
+        )
+        for name, before_time in before.items():
+            after_time = after[name]
+            self.stdout.write(
+                f"{name:<34} {before_time * 1000:>9.2f} {after_time * 1000:>10.2f} "
+                f"{before_time / after_time:>9.1f}x"
+            )
+
+    @staticmethod
+    def get_previous_index(field_name):
+        return models.Index(fields=[field_name], name=f"benchmark_{field_name}_idx")
+
+    def seed(self):
+        options = self.options
+        rng = self.rng
+        now = timezone.now()
+
+        products = Product.objects.bulk_create(
+            Product(name=f"Товар {number}", price=100 + number, image="product.jpg")
+            for number in range(options["products"])
+        )
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f"Ресторан {number}", address=f"Адрес ресторана {number}")
+            for number in range(options["restaurants"])
+        )
+        RestaurantMenuItem.objects.bulk_create(
+            (
+                RestaurantMenuItem(
+                    restaurant=restaurant,
+                    product=product,
+                    availability=rng.random() < 0.9,
+                )
+                for restaurant in restaurants
+                for product in products
+            ),
+            batch_size=5000,
+        )
+        Order.objects.bulk_create(
+            (self.make_order(now) for _ in range(options["orders"])), batch_size=5000
+        )
+        Place.objects.bulk_create(
+            (self.make_place(number) for number in range(options["places"])),
+            batch_size=5000,
+        )
+        self.stdout.write(
+            f"Заказов: {options['orders']}, мест: {options['places']}, "
+            f"ресторанов: {options['restaurants']}, товаров: {options['products']}"
+        )
+
+    def make_order(self, now):
+        rng = self.rng
+        if rng.random() < self.options["open_share"]:
+            status = rng.choice(OPEN_STATUSES)
+        else:
+            status = "completed"
+        return Order(
+            address=f"Адрес заказа {rng.randrange(self.options['places'])}",
+            firstname="Иван",
+            lastname="Петров",
+            phonenumber="+79291000000",
+            payment=rng.choice(["cash", "card"]),
+            status=status,
+            created_at=now - timedelta(seconds=rng.randrange(365 * 24 * 60 * 60)),
+            total_price=Decimal(rng.randrange(100, 5000)),
+            item_count=1,
+            product_ids=[rng.randrange(self.options["products"])],
+        )
+
+    def make_place(self, number):
+        return Place(
+            address=f"Адрес {self.options['seed']}-{number}",
+            normalized_address=f"адрес {self.options['seed']}-{number}",
+            lat=55 + self.rng.random(),
+            lon=37 + self.rng.random(),
+        )
+
+    def measure_all(self, title):
+        for model in (Order, RestaurantMenuItem, Place):
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"ANALYZE {table}")
+
+        board = _annotate_status_order(Order.objects.all())
+        queries = {
+            "доска: невыполненные": lambda: _filter_orders(board, {}),
+            "доска: выполненные": lambda: _filter_orders(
+                board, {"status": "completed"}
+            ),
+        }
+        if self.options["explain"]:
+            self.stdout.write(title)
+            for name, get_queryset in queries.items():
+                self.stdout.write(f"{name}:\n{get_queryset().explain()}")
+
+        timings = {
+            name: self.measure(
+                lambda get_queryset=get_queryset: list(
+                    get_queryset().values_list("id", "status_order", "created_at")[:101]
+                )
+            )
+            for name, get_queryset in queries.items()
+        }
+        timings["каталог: товары в продаже"] = self.measure(
+            lambda: list(Product.objects.available().values_list("id", flat=True))
+        )
+        timings["матрица меню"] = self.measure(
+            lambda: list(
+                RestaurantMenuItem.objects.filter(availability=True).values_list(
+                    "restaurant_id", "product_id"
+                )
+            )
+        )
+        timings["вставка заказа"] = self.measure_inserts(
+            lambda number: self.make_order(timezone.now()).save()
+        )
+        timings["вставка места"] = self.measure_inserts(
+            lambda number: self.make_place(f"new-{number}").save()
+        )
+        return timings
+
+    def measure(self, func):
+        timings = []
+        for _ in range(self.options["repeat"]):
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+        return min(timings)
+
+    def measure_inserts(self, insert):
+        """Среднее время одной вставки, вставленные строки откатываются."""
+        inserts = self.options["inserts"]
+        savepoint = transaction.savepoint()
+        started_at = time.perf_counter()
+        for number in range(inserts):
+            insert(number)
+        elapsed = time.perf_counter() - started_at
+        transaction.savepoint_rollback(savepoint)
+        return elapsed / inserts
@@ -0,0 +1,118 @@
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from restaurateur.matching import RestaurantMenuMatrix
+
+
+def match_with_sets(orders_product_ids, restaurants, restaurant_products):
+    """Прежний способ: проверка issubset для каждой пары заказ-ресторан."""
+    candidates = {}
+    for order_id, product_ids in orders_product_ids.items():
+        candidates[order_id] = [
+            restaurant
+            for restaurant in restaurants
+            if product_ids.issubset(restaurant_products.get(restaurant.id, set()))
+        ]
+    return candidates
+
+
+class Command(BaseCommand):
+    help = "Сравнивает подбор ресторанов для заказов: множества против битовых масок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--orders",
+            type=int,
+            nargs="+",
+            default=[500, 1000, 2000, 5000],
+            help="Количество открытых заказов (можно несколько значений)",
+        )
+        parser.add_argument(
+            "--restaurants", type=int, default=200, help="Количество ресторанов"
+        )
+        parser.add_argument(
+            "--products", type=int, default=150, help="Количество товаров в меню"
+        )
+        parser.add_argument(
+            "--availability",
+            type=float,
+            default=0.95,
+            help="Доля товаров, которые есть в продаже в ресторане",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Повторов для каждого замера"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        restaurants = [
+            SimpleNamespace(id=restaurant_id)
+            for restaurant_id in range(1, options["restaurants"] + 1)
+        ]
+        product_ids = range(1, options["products"] + 1)
+        menu_items = [
+            (restaurant.id, product_id)
+            for restaurant in restaurants
+            for product_id in product_ids
+            if rng.random() < options["availability"]
+        ]
+
+        restaurant_products = {}
+        for restaurant_id, product_id in menu_items:
+            restaurant_products.setdefault(restaurant_id, set()).add(product_id)
+
+        self.stdout.write(
+            f"Ресторанов: {len(restaurants)}, товаров: {len(product_ids)}, "
+            f"позиций меню: {len(menu_items)}"
+        )
+        self.stdout.write(
+            f"{'заказов':>8} {'множества, мс':>14} {'маски, мс':>10} {'ускорение':>10}"
+        )
+
+        for orders_count in options["orders"]:
+            orders_product_ids = {
+                order_id: set(rng.sample(product_ids, rng.randint(1, 10)))
+                for order_id in range(orders_count)
+            }
+
+            sets_time = self.measure(
+                options["repeat"],
+                match_with_sets,
+                orders_product_ids,
+                restaurants,
+                restaurant_products,
+            )
+            masks_time = self.measure(
+                options["repeat"],
+                lambda: RestaurantMenuMatrix(restaurants, menu_items).match_orders(
+                    orders_product_ids
+                ),
+            )
+
+            expected = match_with_sets(
+                orders_product_ids, restaurants, restaurant_products
+            )
+            actual = RestaurantMenuMatrix(restaurants, menu_items).match_orders(
+                orders_product_ids
+            )
+            if expected != actual:
+                self.stderr.write(self.style.ERROR("Результаты подбора не совпадают"))
+                return
+
+            self.stdout.write(
+                f"{orders_count:>8} {sets_time * 1000:>14.1f} "
+                f"{masks_time * 1000:>10.1f} {sets_time / masks_time:>9.1f}x"
+            )
+
+    @staticmethod
+    def measure(repeat, func, *args):
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - started_at)
+        return min(timings)
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+class RestaurantMenuMatrix:
+    """
+    Упакованная матрица доступности товаров по ресторанам.
+
+    Для каждого товара хранится битовая маска ресторанов, где он в продаже:
+    бит i соответствует ресторану restaurants[i]. Рестораны, способные
+    приготовить заказ, - это пересечение (AND) масок всех его товаров,
+    поэтому проверка заказа стоит O(товаров в заказе) операций над целыми
+    числами, а не O(ресторанов × товаров) проверок множеств.
+    """
+
+    def __init__(self, restaurants, menu_items):
+        """
+        restaurants - список ресторанов в порядке вывода,
+        menu_items - пары (restaurant_id, product_id) доступных позиций меню.
+        """
+        self.restaurants = list(restaurants)
+        self.all_restaurants_mask = (1 << len(self.restaurants)) - 1
+
+        positions = {
+            restaurant.id: position
+            for position, restaurant in enumerate(self.restaurants)
+        }
+        self.mask_bytes = (len(self.restaurants) + 7) // 8
+        # Таблицы распаковки: для каждого байта маски и каждого его значения
+        # заранее собран кортеж ресторанов, соответствующих единичным битам
+        self.unpack_tables = [
+            [
+                tuple(
+                    self.restaurants[offset * 8 + bit]
+                    for bit in BYTE_BITS[byte]
+                    if offset * 8 + bit < len(self.restaurants)
+                )
+                for byte in range(256)
+            ]
+            for offset in range(self.mask_bytes)
+        ]
+
+        self.product_masks = defaultdict(int)
+        for restaurant_id, product_id in menu_items:
+            position = positions.get(restaurant_id)
+            if position is not None:
+                self.product_masks[product_id] |= 1 << position
+
+    def get_candidates_mask(self, product_ids):
+        """Возвращает битовую маску ресторанов, где есть все товары."""
+        mask = self.all_restaurants_mask
+        for product_id in product_ids:
+            mask &= self.product_masks.get(product_id, 0)
+            if not mask:
+                break
+        return mask
+
+    def unpack(self, mask):
+        """Превращает битовую маску в список ресторанов."""
+        restaurants = []
+        mask_bytes = mask.to_bytes(self.mask_bytes, "little")
+        for table, byte in zip(self.unpack_tables, mask_bytes):
+            if byte:
+                restaurants.extend(table[byte])
+        return restaurants
+
+    def get_candidates(self, product_ids):
+        """Возвращает рестораны, которые могут приготовить набор товаров."""
+        return self.unpack(self.get_candidates_mask(product_ids))
+
+    def match_orders(self, orders_product_ids):
+        """
+        Подбирает рестораны для всех заказов за один проход.
+
+        orders_product_ids - словарь {order_id: набор ID товаров},
+        возвращает словарь {order_id: список ресторанов}.
+        """
+        masks_cache = {}
+        candidates = {}
+        for order_id, product_ids in orders_product_ids.items():
+            key = frozenset(product_ids)
+            if key not in masks_cache:
+                masks_cache[key] = self.unpack(self.get_candidates_mask(key))
+            candidates[order_id] = masks_cache[key]
+        return candidates
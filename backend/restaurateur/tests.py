@@ -1,3 +1,242 @@
-from django.test import TestCase
+import json
+import math
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from foodcartapp.models import Order
+from foodcartapp.testing import DATA_SIZES, DataSeeder
+from star_burger.server_timing import ServerTimingMiddleware
+
+from .views import (
+    ORDER_EVENTS_BATCH_SIZE,
+    ORDERS_CHUNK_SIZE,
+    _encode_cursor,
+    _encode_event_cursor,
+)
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class ManagerViewsQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user("manager", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+        self.data = DataSeeder(geocoded=True, products_per_order=3)
+
+    def test_view_orders(self):
+        for restaurants_count, products_count, orders_count in DATA_SIZES:
+            self.data.seed(restaurants_count, products_count, orders_count)
+            # Доска заказов делает фиксированное число запросов на пачку строк.
+            # Сессия, пользователь, страница id, рестораны для формы, рестораны
+            # и матрица меню для строк, затем заказы и расстояния на пачку строк
+            chunks = math.ceil(orders_count / ORDERS_CHUNK_SIZE)
+            with self.subTest(orders=orders_count, restaurants=restaurants_count):
+                # Первый запрос заполняет кэши координат и таблицу расстояний,
+                # замеряется повторный
+                b"".join(self.client.get("/manager/orders/").streaming_content)
+                with self.assertNumQueries(6 + 2 * chunks):
+                    response = self.client.get("/manager/orders/")
+                    b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+
+    def test_view_products(self):
+        for restaurants_count, products_count, orders_count in DATA_SIZES:
+            self.data.seed(restaurants_count, products_count, orders_count)
+            with self.subTest(restaurants=restaurants_count, products=products_count):
+                with self.assertNumQueries(5):
+                    response = self.client.get("/manager/products/")
+                self.assertEqual(response.status_code, 200)
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user("manager", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_staff_gets_server_timing(self):
+        self.client.force_login(self.manager)
+        with self.assertLogs("star_burger.server_timing", "DEBUG") as logs:
+            response = self.client.get("/manager/products/")
+
+        fields = json.loads(logs.records[0].getMessage())
+        self.assertEqual(fields["path"], "/manager/products/")
+        self.assertGreater(fields["db_queries"], 0)
+        self.assertGreater(fields["template_ms"], 0)
+        header = response["Server-Timing"]
+        self.assertIn(f'db;desc="{fields["db_queries"]} queries"', header)
+        for metric in ["total;dur=", "geocoder;dur=", "template;dur="]:
+            self.assertIn(metric, header)
+
+    def test_anonymous_gets_no_server_timing(self):
+        with self.assertLogs("star_burger.server_timing", "DEBUG") as logs:
+            response = self.client.get("/api/products/")
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(len(logs.records), 1)
+
+    def test_every_request_logged_at_info_by_default(self):
+        with self.assertLogs("star_burger.server_timing", "INFO") as logs:
+            self.client.get("/api/products/")
+            self.client.get("/api/banners/")
+
+        self.assertEqual(len(logs.records), 2)
+
+    def test_anonymous_request_does_not_load_user(self):
+        def load_user():
+            raise AssertionError("Пользователь загружен без cookie сессии")
+
+        request = RequestFactory().get("/api/products/")
+        request.user = SimpleLazyObject(load_user)
+        middleware = ServerTimingMiddleware(lambda request: HttpResponse())
+
+        with self.assertLogs("star_burger.server_timing"):
+            response = middleware(request)
+
+        self.assertNotIn("Server-Timing", response)
+
+    def test_only_slow_requests_logged_at_info(self):
+        for threshold, levels in ((60_000, ["DEBUG"]), (0, ["INFO"])):
+            with (
+                self.subTest(threshold=threshold),
+                self.settings(SERVER_TIMING_SLOW_REQUEST_MS=threshold),
+                self.assertLogs("star_burger.server_timing", "DEBUG") as logs,
+            ):
+                self.client.get("/api/products/")
+
+            self.assertEqual([record.levelname for record in logs.records], levels)
+
+    def test_streaming_response_logged_when_finished(self):
+        self.client.force_login(self.manager)
+        with self.assertLogs("star_burger.server_timing", "DEBUG") as logs:
+            response = self.client.get("/manager/orders/")
+            self.assertEqual(logs.records, [])
+            b"".join(response.streaming_content)
+
+        # В заголовке - запросы до начала ответа, в логе - все запросы
+        header_queries = int(
+            response["Server-Timing"].split('db;desc="')[1].split(" ")[0]
+        )
+        fields = json.loads(logs.records[0].getMessage())
+        self.assertGreater(fields["db_queries"], header_queries)
+
+
+@override_settings(GEOCODER_BACKGROUND_WORKERS=0, GEOCODER_SNAPSHOT_PATH="")
+class OrderEventsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user("manager", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def get_events(self, cursor):
+        with patch("restaurateur.views.ORDER_EVENTS_WAIT", 0):
+            response = self.client.get(
+                reverse("restaurateur:view_order_events"), HTTP_LAST_EVENT_ID=cursor
+            )
+            content = b"".join(response.streaming_content).decode()
+
+        events = []
+        for block in content.split("\n\n"):
+            fields = dict(
+                line.split(": ", 1) for line in block.splitlines() if ": " in line
+            )
+            if fields.get("event") == "order":
+                events.append((fields["id"], json.loads(fields["data"])))
+        return events
+
+    def test_changes_delivered_in_batches(self):
+        # Все заказы изменены в один момент: курсор различает их по id
+        changed_at = timezone.now() - timedelta(minutes=1)
+        orders = Order.objects.bulk_create(
+            Order(
+                address=f"Москва, Заказная, {number}",
+                firstname="Иван",
+                phonenumber="+79291000000",
+                payment="cash",
+            )
+            for number in range(ORDER_EVENTS_BATCH_SIZE + 5)
+        )
+        Order.objects.update(updated_at=changed_at)
+
+        cursor = _encode_event_cursor(changed_at - timedelta(seconds=1), 0)
+        batches = []
+        for _ in range(3):
+            events = self.get_events(cursor)
+            batches.append([change["id"] for _, change in events])
+            if events:
+                cursor = events[-1][0]
+
+        self.assertEqual([len(batch) for batch in batches], [100, 5, 0])
+        self.assertEqual(
+            batches[0] + batches[1], sorted(order.id for order in orders)
+        )
+
+    def test_order_leaving_board_sent_without_html(self):
+        order = Order.objects.create(
+            address="Москва, Заказная, 1",
+            firstname="Иван",
+            phonenumber="+79291000000",
+            payment="cash",
+        )
+        changed_at = timezone.now() - timedelta(minutes=1)
+        Order.objects.filter(id=order.id).update(status="completed")
+        Order.objects.update(updated_at=changed_at)
+
+        events = self.get_events(_encode_event_cursor(changed_at, 0))
+
+        self.assertEqual(
+            [change for _, change in events], [{"id": order.id, "html": None}]
+        )
+
+    def test_rows_carry_page_range_and_sort_keys(self):
+        orders = [
+            Order.objects.create(
+                address=f"Москва, Заказная, {number}",
+                firstname="Иван",
+                phonenumber="+79291000000",
+                payment="cash",
+                status=status,
+            )
+            for number, status in enumerate(["pending", "assembly", "pending"])
+        ]
+
+        with patch("restaurateur.views.ORDERS_PAGE_SIZE", 2):
+            response = self.client.get(reverse("restaurateur:view_orders"))
+            content = b"".join(response.streaming_content).decode()
+
+        # Первая страница: необработанные заказы от новых к старым
+        first_key = _encode_cursor(1, orders[2].created_at, orders[2].id)
+        last_key = _encode_cursor(1, orders[0].created_at, orders[0].id)
+        self.assertIn('data-page-after=""', content)
+        self.assertIn(f'data-page-last="{last_key}"', content)
+        self.assertIn(
+            f'id="order-{orders[2].id}" data-sort-key="{first_key}"', content
+        )
+        self.assertNotIn(f'id="order-{orders[1].id}"', content)
+
+        # Строка события несёт новый ключ, по нему страница переставляет её
+        changed_at = timezone.now() - timedelta(minutes=1)
+        Order.objects.filter(id=orders[2].id).update(
+            status="assembly", updated_at=changed_at
+        )
+        events = self.get_events(_encode_event_cursor(changed_at, 0))
+
+        moved_key = _encode_cursor(2, orders[2].created_at, orders[2].id)
+        self.assertIn(f'data-sort-key="{moved_key}"', events[0][1]["html"])
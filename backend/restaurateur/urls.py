@@ -11,6 +11,12 @@ urlpatterns = [
     path("restaurants/", views.view_restaurants, name="RestaurantView"),
     # TODO заглушка для нереализованного функционала
     path("orders/", views.view_orders, name="view_orders"),
+    path("orders/events/", views.view_order_events, name="view_order_events"),
+    path(
+        "geocoder/status/",
+        views.view_geocoder_status,
+        name="view_geocoder_status",
+    ),
     path("login/", views.LoginView.as_view(), name="login"),
     path("logout/", views.LogoutView.as_view(), name="logout"),
 ]
\ No newline at end of file
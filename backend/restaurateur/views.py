@@ -1,7 +1,15 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+
 from django import forms
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 
 from django.contrib.auth import authenticate, login
@@ -13,14 +21,34 @@ from foodcartapp.models import (
     Restaurant,
     RestaurantMenuItem,
     Order,
-    OrderItem,
 )
-from places.models import Place
-from django.db.models import Case, When, Value, IntegerField
-from places.geocoder import get_coordinates
-from django.db.models import Prefetch
-from collections import defaultdict
-from places.geocoder import calculate_distance
+from django.db.models import Case, When, Value, IntegerField, Q
+from places.geocoder import (
+    geocoding_budget,
+    get_cached_coordinates,
+    get_circuit_breaker,
+    get_coordinates_cache,
+    get_coordinates_snapshot,
+)
+from places.distances import get_restaurant_distances
+
+from .matching import RestaurantMenuMatrix
+
+ORDERS_PAGE_SIZE = 100
+ORDERS_CHUNK_SIZE = 25
+ORDER_ROWS_PLACEHOLDER = "<!-- order rows -->"
+CURSOR_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# Сколько запрос событий ждёт изменений и как часто опрашивает БД, секунды.
+# Ожидание короткое: запрос занимает воркер gunicorn, а браузер сам
+# переподключается через ORDER_EVENTS_RETRY_MS
+ORDER_EVENTS_WAIT = 5
+ORDER_EVENTS_POLL_INTERVAL = 1
+ORDER_EVENTS_RETRY_MS = 1000
+ORDER_EVENTS_BATCH_SIZE = 100
+# Транзакция может закоммититься позже, чем получила updated_at, поэтому
+# изменения моложе этого срока не отдаются, и курсор их не перескочит
+ORDER_EVENTS_SETTLE = timedelta(seconds=1)
 
 
 class Login(forms.Form):
@@ -116,29 +144,115 @@ def view_restaurants(request):
     )
 
 
-def _get_order_queryset():
-    """Возвращает QuerySet заказов с аннотацией для сортировки."""
-    return (
-        Order.objects.with_total_price()
-        .exclude(status="completed")
-        .select_related("restaurant")
-        .prefetch_related(
-            Prefetch(
-                "items",
-                queryset=OrderItem.objects.select_related("product"),
-            )
+class OrdersFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        label="Статус",
+        choices=[("", "Все необработанные")] + Order.STATUS_CHOICES,
+        required=False,
+    )
+    restaurant = forms.ModelChoiceField(
+        label="Ресторан",
+        queryset=Restaurant.objects.order_by("name"),
+        empty_label="Все рестораны",
+        required=False,
+    )
+    date_from = forms.DateField(
+        label="С",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+    date_to = forms.DateField(
+        label="По",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_after(self):
+        cursor = self.cleaned_data["after"]
+        if not cursor:
+            return None
+        try:
+            return _decode_cursor(cursor)
+        except ValueError:
+            raise forms.ValidationError("Некорректная ссылка на страницу заказов")
+
+
+def _to_microseconds(moment):
+    return (moment - CURSOR_EPOCH) // timedelta(microseconds=1)
+
+
+def _from_microseconds(microseconds):
+    return CURSOR_EPOCH + timedelta(microseconds=microseconds)
+
+
+def _encode_cursor(status_order, created_at, order_id):
+    """Позиция последнего заказа страницы для ключевой пагинации."""
+    return f"{status_order}.{_to_microseconds(created_at)}.{order_id}"
+
+
+def _decode_cursor(cursor):
+    status_order, microseconds, order_id = (int(part) for part in cursor.split("."))
+    return status_order, _from_microseconds(microseconds), order_id
+
+
+def _encode_event_cursor(updated_at, order_id):
+    """Позиция изменения заказа в ленте событий доски."""
+    return f"{_to_microseconds(updated_at)}.{order_id}"
+
+
+def _decode_event_cursor(cursor):
+    microseconds, order_id = (int(part) for part in cursor.split("."))
+    return _from_microseconds(microseconds), order_id
+
+
+def _annotate_status_order(orders):
+    return orders.annotate(
+        status_order=Case(
+            When(status="pending", then=Value(1)),
+            When(status="assembly", then=Value(2)),
+            When(status="delivery", then=Value(3)),
+            default=Value(99),
+            output_field=IntegerField(),
         )
-        .annotate(
-            status_order=Case(
-                When(status="pending", then=Value(1)),
-                When(status="assembly", then=Value(2)),
-                When(status="delivery", then=Value(3)),
-                default=Value(99),
-                output_field=IntegerField(),
-            )
+    ).order_by("status_order", "-created_at", "-id")
+
+
+def _get_order_queryset():
+    """
+    Возвращает QuerySet заказов с аннотацией для сортировки. Сумма и товары
+    заказа хранятся в самом заказе, поэтому позиции не загружаются.
+    """
+    return _annotate_status_order(Order.objects.select_related("restaurant"))
+
+
+def _filter_orders(orders, filters):
+    """
+    Применяет фильтры формы OrdersFilterForm. Без фильтра по статусу
+    выполненные заказы не показываются.
+    """
+    if filters.get("status"):
+        # status_order у всех заказов одинаковый, а без него в сортировке
+        # строки идут прямо в порядке индекса order_status_created_idx
+        orders = orders.filter(status=filters["status"]).order_by("-created_at", "-id")
+    else:
+        orders = orders.exclude(status="completed")
+
+    if filters.get("restaurant"):
+        orders = orders.filter(restaurant=filters["restaurant"])
+    if filters.get("date_from"):
+        orders = orders.filter(created_at__date__gte=filters["date_from"])
+    if filters.get("date_to"):
+        orders = orders.filter(created_at__date__lte=filters["date_to"])
+
+    if filters.get("after"):
+        status_order, created_at, order_id = filters["after"]
+        orders = orders.filter(
+            Q(status_order__gt=status_order)
+            | Q(status_order=status_order, created_at__lt=created_at)
+            | Q(status_order=status_order, created_at=created_at, id__lt=order_id)
         )
-        .order_by("status_order", "-created_at")
-    )
+    return orders
 
 
 def _collect_addresses(orders, restaurants):
@@ -155,54 +269,52 @@ def _collect_addresses(orders, restaurants):
 
 
 def _build_coordinates_cache(addresses_to_geocode):
-    """Создает кэш координат для адресов."""
-    existing_places = Place.objects.filter(address__in=addresses_to_geocode)
-    coordinates_cache = {}
-
-    for place in existing_places:
-        if place.lat and place.lon:
-            coordinates_cache[place.address] = (place.lat, place.lon)
-
-    for address in addresses_to_geocode:
-        if address not in coordinates_cache:
-            coords = get_coordinates(address)
-            coordinates_cache[address] = coords
-
-    return coordinates_cache
-
-
-def _build_restaurant_products_cache():
-    """Создает кэш товаров, доступных в каждом ресторане."""
-    restaurant_menu_items = RestaurantMenuItem.objects.filter(
-        availability=True
-    ).select_related("restaurant", "product")
-
-    restaurant_products = {}
-    for menu_item in restaurant_menu_items:
-        restaurant_id = menu_item.restaurant.id
-        if restaurant_id not in restaurant_products:
-            restaurant_products[restaurant_id] = set()
-        restaurant_products[restaurant_id].add(menu_item.product.id)
-
-    return restaurant_products
+    """
+    Создает кэш координат для адресов без обращения к геокодеру.
+    Адреса, которых ещё нет в БД, геокодируются в фоне и возвращаются
+    отдельным множеством.
+    """
+    return get_cached_coordinates(addresses_to_geocode)
+
+
+def _build_restaurant_products_cache(restaurants):
+    """Создает матрицу товаров, доступных в каждом ресторане."""
+    menu_items = RestaurantMenuItem.objects.filter(availability=True).values_list(
+        "restaurant_id", "product_id"
+    )
+    return RestaurantMenuMatrix(restaurants, menu_items)
 
 
 def _get_order_product_ids(order):
     """Возвращает множество ID товаров в заказе."""
-    return set(item.product.id for item in order.items.all())
+    return set(order.product_ids)
+
+
+def _build_distances_cache(orders, matching_restaurants, coordinates_cache):
+    """
+    Получает расстояния от ресторанов до заказов из таблицы расстояний.
+    Для заказа с выбранным рестораном нужно одно расстояние, для остальных -
+    до каждого подходящего ресторана. Заказы без координат пропускаются.
+    """
+    pairs = []
+    for order in orders:
+        if not coordinates_cache.get(order.address):
+            continue
+        if order.restaurant:
+            pairs.append((order.restaurant, order.address))
+        else:
+            pairs.extend(
+                (restaurant, order.address)
+                for restaurant in matching_restaurants[order.id]
+            )
+    return get_restaurant_distances(pairs)
 
 
-def _get_restaurants_with_distances(order_coords, restaurants, coordinates_cache):
+def _get_restaurants_with_distances(order, restaurants, distances_cache):
     """Возвращает список ресторанов с расстояниями до заказа."""
     restaurants_with_distances = []
-
     for restaurant in restaurants:
-        restaurant_coords = coordinates_cache.get(restaurant.address)
-        distance = None
-
-        if order_coords and restaurant_coords:
-            distance = calculate_distance(order_coords, restaurant_coords)
-
+        distance = distances_cache.get((restaurant.id, order.address))
         restaurants_with_distances.append(
             {
                 "restaurant": restaurant,
@@ -221,15 +333,12 @@ def _get_restaurants_with_distances(order_coords, restaurants, coordinates_cache
     return restaurants_with_distances
 
 
-def _process_order_with_restaurant(order, coordinates_cache, total_price):
+def _process_order_with_restaurant(
+    order, coordinates_cache, distances_cache, total_price
+):
     """Обрабатывает заказ с уже выбранным рестораном."""
     order_coords = coordinates_cache.get(order.address)
-    distance_to_selected = None
-
-    if order_coords and order.restaurant.address in coordinates_cache:
-        restaurant_coords = coordinates_cache.get(order.restaurant.address)
-        if restaurant_coords:
-            distance_to_selected = calculate_distance(order_coords, restaurant_coords)
+    distance_to_selected = distances_cache.get((order.restaurant.id, order.address))
 
     return {
         "order": order,
@@ -245,20 +354,13 @@ def _process_order_with_restaurant(order, coordinates_cache, total_price):
 
 
 def _process_order_without_restaurant(
-    order, coordinates_cache, restaurant_products, all_restaurants, total_price
+    order, coordinates_cache, distances_cache, matching_restaurants, total_price
 ):
     """Обрабатывает заказ без выбранного ресторана."""
     order_coords = coordinates_cache.get(order.address)
-    order_product_ids = _get_order_product_ids(order)
-
-    matching_restaurants = []
-    for restaurant in all_restaurants:
-        available_products = restaurant_products.get(restaurant.id, set())
-        if order_product_ids.issubset(available_products):
-            matching_restaurants.append(restaurant)
 
     restaurants_with_distances = _get_restaurants_with_distances(
-        order_coords, matching_restaurants, coordinates_cache
+        order, matching_restaurants, distances_cache
     )
 
     return {
@@ -270,15 +372,23 @@ def _process_order_without_restaurant(
     }
 
 
-@user_passes_test(is_manager, login_url="restaurateur:login")
-def view_orders(request):
-    orders = _get_order_queryset()
-    all_restaurants = list(Restaurant.objects.all())
-
-    addresses_to_geocode = _collect_addresses(orders, all_restaurants)
-    coordinates_cache = _build_coordinates_cache(addresses_to_geocode)
+def _build_orders_data(orders, restaurants, restaurant_products):
+    """Готовит строки доски заказов: рестораны, расстояния и координаты."""
+    addresses_to_geocode = _collect_addresses(orders, restaurants)
+    coordinates_cache, pending_addresses = _build_coordinates_cache(
+        addresses_to_geocode
+    )
 
-    restaurant_products = _build_restaurant_products_cache()
+    matching_restaurants = restaurant_products.match_orders(
+        {
+            order.id: _get_order_product_ids(order)
+            for order in orders
+            if not order.restaurant
+        }
+    )
+    distances_cache = _build_distances_cache(
+        orders, matching_restaurants, coordinates_cache
+    )
 
     orders_data = []
     for order in orders:
@@ -286,23 +396,220 @@ def view_orders(request):
 
         if order.restaurant:
             order_data = _process_order_with_restaurant(
-                order, coordinates_cache, total_price
+                order, coordinates_cache, distances_cache, total_price
             )
         else:
             order_data = _process_order_without_restaurant(
                 order,
                 coordinates_cache,
-                restaurant_products,
-                all_restaurants,
+                distances_cache,
+                matching_restaurants[order.id],
                 total_price,
             )
 
+        order_data["order_coords_pending"] = order.address in pending_addresses
+        # По ключу сортировки страница решает, остаётся ли строка на ней
+        order_data["sort_key"] = _encode_cursor(
+            order.status_order, order.created_at, order.id
+        )
         orders_data.append(order_data)
 
-    return render(
-        request,
-        template_name="order_items.html",
+    return orders_data
+
+
+def _stream_order_rows(request, order_ids):
+    """
+    Отдаёт HTML строк заказов пачками по ORDERS_CHUNK_SIZE: в памяти
+    одновременно только одна пачка заказов с позициями и расстояниями.
+    """
+    rows_template = get_template("order_rows.html")
+    restaurants = list(Restaurant.objects.all())
+    restaurant_products = _build_restaurant_products_cache(restaurants)
+
+    for start in range(0, len(order_ids), ORDERS_CHUNK_SIZE):
+        orders = list(
+            _get_order_queryset().filter(
+                id__in=order_ids[start:start + ORDERS_CHUNK_SIZE]
+            )
+        )
+        # Генератор работает уже после выхода из view, поэтому бюджет
+        # геокодирования задаётся на каждую пачку
+        with geocoding_budget():
+            orders_data = _build_orders_data(
+                orders, restaurants, restaurant_products
+            )
+        yield rows_template.render({"order_items": orders_data}, request)
+
+
+@user_passes_test(is_manager, login_url="restaurateur:login")
+@geocoding_budget()
+def view_orders(request):
+    """
+    Доска заказов с фильтрами и ключевой пагинацией по
+    (status_order, -created_at, -id): следующая страница начинается после
+    последнего заказа предыдущей, без OFFSET. Страница отдаётся потоком,
+    строки рендерятся пачками.
+    """
+    filter_form = OrdersFilterForm(request.GET)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    # Курсор изменений берётся до чтения заказов: всё, что изменится позже,
+    # придёт через view_order_events
+    events_params = request.GET.copy()
+    events_params.pop("after", None)
+    loaded_at = datetime.now(timezone.utc) - ORDER_EVENTS_SETTLE
+    events_params["cursor"] = _encode_event_cursor(loaded_at, 0)
+    events_url = "{}?{}".format(
+        reverse("restaurateur:view_order_events"), events_params.urlencode()
+    )
+
+    page = list(
+        _filter_orders(_annotate_status_order(Order.objects.all()), filters)
+        .values_list("id", "status_order", "created_at")[:ORDERS_PAGE_SIZE + 1]
+    )
+
+    # Границы страницы в порядке сортировки: строка с ключом после
+    # page_after и не дальше page_last принадлежит этой странице
+    page_after = filters.get("after") and _encode_cursor(*filters["after"])
+    page_last = None
+    next_page_url = None
+    if len(page) > ORDERS_PAGE_SIZE:
+        page = page[:ORDERS_PAGE_SIZE]
+        order_id, status_order, created_at = page[-1]
+        page_last = _encode_cursor(status_order, created_at, order_id)
+        params = request.GET.copy()
+        params["after"] = page_last
+        next_page_url = f"?{params.urlencode()}"
+
+    content = render_to_string(
+        "order_items.html",
         context={
-            "order_items": orders_data,
+            "filter_form": filter_form,
+            "next_page_url": next_page_url,
+            "events_url": events_url,
+            "page_after": page_after or "",
+            "page_last": page_last or "",
+            "loaded_at": _to_microseconds(loaded_at),
+            "order_rows": mark_safe(ORDER_ROWS_PLACEHOLDER),
+        },
+        request=request,
+    )
+    head, tail = content.split(ORDER_ROWS_PLACEHOLDER)
+    order_ids = [order_id for order_id, _, _ in page]
+
+    return StreamingHttpResponse(
+        chain([head], _stream_order_rows(request, order_ids), [tail]),
+        content_type="text/html; charset=utf-8",
+    )
+
+
+def _format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _find_order_changes(cursor):
+    """
+    Изменения заказов после курсора (updated_at, id) в порядке изменения,
+    не больше ORDER_EVENTS_BATCH_SIZE. Изменения моложе
+    ORDER_EVENTS_SETTLE пропускаются до следующего запроса.
+    """
+    updated_at, order_id = cursor
+    return list(
+        Order.objects.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id),
+            updated_at__lte=datetime.now(timezone.utc) - ORDER_EVENTS_SETTLE,
+        )
+        .order_by("updated_at", "id")
+        .values_list("id", "updated_at")[:ORDER_EVENTS_BATCH_SIZE]
+    )
+
+
+def _stream_order_events(request, filters, cursor):
+    """
+    Ждёт до ORDER_EVENTS_WAIT секунд первых изменений заказов после курсора,
+    отправляет их строки событиями order: {"id": ..., "html": ...} и
+    завершает ответ. Заказ, который больше не проходит фильтры доски
+    (например, выполнен), приходит с html = null, и страница удаляет строку.
+    Браузер переподключается с заголовком Last-Event-ID - курсором
+    последнего полученного изменения.
+    """
+    yield f"retry: {ORDER_EVENTS_RETRY_MS}\n\n"
+
+    deadline = time.monotonic() + ORDER_EVENTS_WAIT
+    changes = _find_order_changes(cursor)
+    while not changes and time.monotonic() < deadline:
+        time.sleep(ORDER_EVENTS_POLL_INTERVAL)
+        changes = _find_order_changes(cursor)
+    if not changes:
+        return
+
+    restaurants = list(Restaurant.objects.all())
+    restaurant_products = _build_restaurant_products_cache(restaurants)
+    board_orders = _filter_orders(_get_order_queryset(), {**filters, "after": None})
+    orders = list(board_orders.filter(id__in=[order_id for order_id, _ in changes]))
+    with geocoding_budget():
+        orders_data = _build_orders_data(orders, restaurants, restaurant_products)
+    rows_template = get_template("order_rows.html")
+    rows = {
+        order_data["order"].id: rows_template.render(
+            {"order_items": [order_data]}, request
+        )
+        for order_data in orders_data
+    }
+
+    for order_id, updated_at in changes:
+        yield _format_event(
+            "order",
+            {"id": order_id, "html": rows.get(order_id)},
+            _encode_event_cursor(updated_at, order_id),
+        )
+
+
+@user_passes_test(is_manager, login_url="restaurateur:login")
+def view_order_events(request):
+    """
+    Server-Sent Events с изменёнными строками доски заказов в режиме
+    long polling: ответ закрывается после первой пачки изменений или
+    через ORDER_EVENTS_WAIT секунд. Курсор - updated_at и id последнего
+    отправленного изменения, берётся из заголовка Last-Event-ID или
+    параметра cursor.
+    """
+    filter_form = OrdersFilterForm(request.GET)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    cursor = request.headers.get("Last-Event-ID") or request.GET.get("cursor")
+    try:
+        cursor = _decode_event_cursor(cursor)
+    except (AttributeError, ValueError):
+        cursor = (datetime.now(timezone.utc) - ORDER_EVENTS_SETTLE, 0)
+
+    response = StreamingHttpResponse(
+        _stream_order_events(request, filters, cursor),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx не должен буферизовать поток событий
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@user_passes_test(is_manager, login_url="restaurateur:login")
+def view_geocoder_status(request):
+    """
+    Состояние автомата геокодера, счётчики кэша координат и снимок
+    координат в процессе, обработавшем запрос.
+    """
+    snapshot = get_coordinates_snapshot()
+    return JsonResponse(
+        {
+            **get_circuit_breaker().get_state(),
+            "coordinates_cache": get_coordinates_cache().get_stats(),
+            "snapshot": snapshot.get_state() if snapshot else None,
         },
+        json_dumps_params={"ensure_ascii": False, "indent": 4},
     )
@@ -0,0 +1,90 @@
+"""
+Замеры времени текущего запроса. Модуль не зависит от приложений проекта,
+поэтому блоки кода из любого приложения можно замерять через timing,
+а собирает замеры ServerTimingMiddleware из star_burger.server_timing.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_current = threading.local()
+
+
+class RequestTimings:
+    """Замеры одного запроса, время в секундах."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations = {"db": 0.0, "geocoder": 0.0, "template": 0.0}
+        self.queries = 0
+        self.depth = {}
+
+    def get_total(self):
+        return time.perf_counter() - self.started_at
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations["db"] += time.perf_counter() - started_at
+            self.queries += 1
+
+    @contextmanager
+    def activate(self):
+        """Собирает замеры текущего потока в этот объект до конца блока."""
+        previous = getattr(_current, "timings", None)
+        _current.timings = self
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(self.execute_wrapper)
+                    )
+                yield
+        finally:
+            _current.timings = previous
+
+    def get_header(self):
+        total = self.get_total() * 1000
+        db = self.durations["db"] * 1000
+        geocoder = self.durations["geocoder"] * 1000
+        template = self.durations["template"] * 1000
+        return (
+            f"total;dur={total:.1f}, "
+            f'db;desc="{self.queries} queries";dur={db:.1f}, '
+            f"geocoder;dur={geocoder:.1f}, "
+            f"template;dur={template:.1f}"
+        )
+
+    def get_log_fields(self):
+        return {
+            "total_ms": round(self.get_total() * 1000, 1),
+            "db_ms": round(self.durations["db"] * 1000, 1),
+            "db_queries": self.queries,
+            "geocoder_ms": round(self.durations["geocoder"] * 1000, 1),
+            "template_ms": round(self.durations["template"] * 1000, 1),
+        }
+
+
+@contextmanager
+def timing(name):
+    """
+    Добавляет время блока к замеру name текущего запроса. Работает и как
+    декоратор. Вложенные блоки с тем же именем не учитываются повторно,
+    вне запроса замер не ведётся.
+    """
+    timings = getattr(_current, "timings", None)
+    if timings is None or timings.depth.get(name):
+        yield
+        return
+
+    timings.depth[name] = 1
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started_at
+        timings.depth[name] = 0
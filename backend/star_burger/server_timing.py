@@ -0,0 +1,100 @@
+"""
+Замер времени обработки запроса: общее время, время и число SQL-запросов,
+время геокодера и отрисовки шаблонов. Сотрудникам замеры отдаются
+в заголовке Server-Timing, для каждого запроса пишется строка в лог
+с уровнем INFO. SERVER_TIMING_SLOW_REQUEST_MS оставляет на INFO только
+медленные запросы, остальные пишутся с DEBUG.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.exceptions import TemplateDoesNotExist
+
+from .request_timings import RequestTimings, timing
+
+logger = logging.getLogger(__name__)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timing("template"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, учитывающий время отрисовки в замерах запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            raise TemplateDoesNotExist(
+                *exc.args, tried=exc.tried, backend=self, chain=exc.chain
+            ) from exc
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет запрос и отдаёт Server-Timing сотрудникам. У потоковых ответов
+    заголовок описывает время до начала ответа, а строка лога пишется,
+    когда ответ отдан целиком.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        with timings.activate():
+            response = self.get_response(request)
+
+        if self.is_staff(request):
+            response["Server-Timing"] = timings.get_header()
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, timings
+            )
+        else:
+            self.log(request, response, timings)
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        # request.user ленивый: без cookie сессии пользователь анонимный,
+        # и загружать сессию с пользователем ради заголовка незачем
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return False
+        user = getattr(request, "user", None)
+        return user is not None and user.is_staff
+
+    def stream(self, request, response, content, timings):
+        iterator = iter(content)
+        try:
+            while True:
+                with timings.activate():
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.log(request, response, timings)
+
+    @staticmethod
+    def log(request, response, timings):
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            **timings.get_log_fields(),
+        }
+        level = logging.DEBUG
+        if fields["total_ms"] >= settings.SERVER_TIMING_SLOW_REQUEST_MS:
+            level = logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(fields, ensure_ascii=False))
@@ -16,6 +16,10 @@ SECRET_KEY = env("SECRET_KEY")
 DEBUG = env.bool("DEBUG", True)
 
 YANDEX_GEOCODER_API_KEY = os.getenv("YANDEX_GEOCODER_API_KEY")
+GEOCODER_BACKEND = env.str(
+    "GEOCODER_BACKEND", "places.backends.YandexGeocoderBackend"
+)
+GEOCODER_BACKEND_OPTIONS = env.json("GEOCODER_BACKEND_OPTIONS", {})
 
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", ["127.0.0.1", "localhost"])
 
@@ -33,12 +37,12 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "rest_framework",
     "places",
 ]
 
 MIDDLEWARE = [
+    "star_burger.server_timing.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,10 +50,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "rollbar.contrib.django.middleware.RollbarNotifierMiddleware",
 ]
 
+# Панель отладки замедляет каждый запрос, в продакшене она не подключается
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    # Перед RollbarNotifierMiddleware, последним в списке
+    MIDDLEWARE.insert(-1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "star_burger.urls"
 
 DEBUG_TOOLBAR_PANELS = [
@@ -69,7 +78,8 @@ DEBUG_TOOLBAR_PANELS = [
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Шаблонизатор Django, время отрисовки попадает в Server-Timing
+        "BACKEND": "star_burger.server_timing.TimedDjangoTemplates",
         "DIRS": [
             os.path.join(BASE_DIR, "templates"),
         ],
@@ -93,6 +103,32 @@ ROLLBAR = {
     "enabled": bool(env.str("ROLLBAR_ACCESS_TOKEN", "")),
 }
 
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Строка с замерами на каждый запрос, WARNING отключает её
+        "star_burger.server_timing": {
+            "handlers": ["console"],
+            "level": env.str("SERVER_TIMING_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
+# Запросы быстрее этого времени, мс, пишутся в лог замеров с уровнем DEBUG.
+# По умолчанию 0: с INFO пишется каждый запрос
+SERVER_TIMING_SLOW_REQUEST_MS = env.float("SERVER_TIMING_SLOW_REQUEST_MS", 0)
+
+REST_FRAMEWORK = {
+    "DEFAULT_THROTTLE_RATES": {
+        "nearest_restaurants": env.str("NEAREST_RESTAURANTS_THROTTLE_RATE", "30/min"),
+    },
+}
+
 WSGI_APPLICATION = "star_burger.wsgi.application"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
@@ -135,7 +171,24 @@ STATIC_URL = "/static/"
 
 INTERNAL_IPS = ["127.0.0.1"]
 
-GEOCODER_CACHE_DAYS = 30
+GEOCODER_CACHE_DAYS = env.int("GEOCODER_CACHE_DAYS", 30)
+GEOCODER_NEGATIVE_CACHE_HOURS = env.int("GEOCODER_NEGATIVE_CACHE_HOURS", 6)
+GEOCODER_BACKGROUND_WORKERS = env.int("GEOCODER_BACKGROUND_WORKERS", 2)
+GEOCODER_MAX_WORKERS = env.int("GEOCODER_MAX_WORKERS", 4)
+GEOCODER_RATE_LIMIT = env.float("GEOCODER_RATE_LIMIT", 10)
+GEOCODER_BREAKER_THRESHOLD = env.int("GEOCODER_BREAKER_THRESHOLD", 5)
+GEOCODER_BREAKER_COOLDOWN = env.int("GEOCODER_BREAKER_COOLDOWN", 60)
+GEOCODER_REQUEST_BUDGET = env.float("GEOCODER_REQUEST_BUDGET", 3)
+GEOCODER_LOCAL_CACHE_SIZE = env.int("GEOCODER_LOCAL_CACHE_SIZE", 10000)
+GEOCODER_LOCAL_CACHE_TIMEOUT = env.int("GEOCODER_LOCAL_CACHE_TIMEOUT", 60)
+GEOCODER_SHARED_CACHE_TIMEOUT = env.int("GEOCODER_SHARED_CACHE_TIMEOUT", 60 * 60)
+GEOCODER_SNAPSHOT_PATH = env.str(
+    "GEOCODER_SNAPSHOT_PATH", os.path.join(BASE_DIR, "places_snapshot.bin")
+)
+
+CACHES = {
+    "default": env.dj_cache_url("CACHE_URL", default="locmem://"),
+}
 
 
 STATICFILES_DIRS = [